@@ -0,0 +1,245 @@
+"""Show counts per venue and per artist, bucketed by day, week or month.
+
+Counting shows for a range would read every show in it, so the counts are
+kept in a rollup table with one row per (venue or artist, day), and a range
+of several years reads at most a few rows per day. Database triggers update
+the rollup in the same transaction as every insert, delete or move of a
+show, including the bulk executemany paths that bypass the ORM events. On
+Postgres they are statement level triggers over the transition tables, so
+a bulk statement costs one grouped upsert. ``check_rollup()`` recomputes the
+table from the shows and reports drift.
+
+Buckets are grouped in SQL with ``date_trunc`` (weeks start on Monday); on
+SQLite, used for local tests, with the equivalent ``date()`` modifiers.
+Shows of soft deleted venues are counted until the venue is purged.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    DDL,
+    Date,
+    DateTime,
+    and_,
+    cast,
+    event,
+    func,
+    literal_column,
+    type_coerce,
+)
+
+BUCKETS = ("day", "week", "month")
+KINDS = {"venue": "venue_id", "artist": "artist_id"}
+
+# Postgres: one function per operation, each aggregating the rows changed
+# by the statement into signed per day deltas
+POSTGRES_CHANGES = (
+    "SELECT 'venue' AS kind, venue_id AS owner_id, start_time::date AS day, "
+    "{sign} AS delta FROM {rows} "
+    "UNION ALL SELECT 'artist', artist_id, start_time::date, {sign} FROM {rows}"
+)
+POSTGRES_FUNCTION = """
+CREATE OR REPLACE FUNCTION "{table}_{op}"() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO "{table}" (kind, owner_id, day, shows)
+    SELECT kind, owner_id, day, sum(delta) FROM ({changes}) AS changes
+    GROUP BY kind, owner_id, day HAVING sum(delta) <> 0
+    ON CONFLICT (kind, owner_id, day)
+    DO UPDATE SET shows = "{table}".shows + EXCLUDED.shows;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+POSTGRES_TRIGGER = (
+    'CREATE TRIGGER "{table}_{op}" AFTER {event} ON "{shows}" '
+    "REFERENCING {transitions} FOR EACH STATEMENT "
+    'EXECUTE PROCEDURE "{table}_{op}"()'
+)
+# SQLite has row level triggers only
+SQLITE_UPSERT = (
+    'INSERT INTO "{table}" (kind, owner_id, day, shows) '
+    "VALUES ('{kind}', {row}.{column}, date({row}.start_time), {sign}) "
+    "ON CONFLICT (kind, owner_id, day) DO UPDATE SET shows = shows + {sign};"
+)
+SQLITE_TRIGGER = (
+    'CREATE TRIGGER "{table}_{op}" AFTER {event} ON "{shows}" BEGIN {body} END'
+)
+
+
+def postgres_ddl(shows, table):
+    inserted = POSTGRES_CHANGES.format(sign=1, rows="new_rows")
+    deleted = POSTGRES_CHANGES.format(sign=-1, rows="old_rows")
+    operations = [
+        ("insert", "INSERT", "NEW TABLE AS new_rows", inserted),
+        ("delete", "DELETE", "OLD TABLE AS old_rows", deleted),
+        (
+            "update",
+            "UPDATE",
+            "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+            f"{inserted} UNION ALL {deleted}",
+        ),
+    ]
+    statements = list()
+    for op, event_name, transitions, changes in operations:
+        statements.append(POSTGRES_FUNCTION.format(table=table, op=op, changes=changes))
+        statements.append(
+            POSTGRES_TRIGGER.format(
+                table=table,
+                op=op,
+                event=event_name,
+                shows=shows,
+                transitions=transitions,
+            )
+        )
+    return statements
+
+
+def sqlite_ddl(shows, table):
+    def upserts(row, sign):
+        return " ".join(
+            SQLITE_UPSERT.format(
+                table=table, kind=kind, row=row, column=column, sign=sign
+            )
+            for kind, column in KINDS.items()
+        )
+
+    return [
+        SQLITE_TRIGGER.format(
+            table=table, op=op, event=event_name, shows=shows, body=body
+        )
+        for op, event_name, body in (
+            ("insert", "INSERT", upserts("new", 1)),
+            ("delete", "DELETE", upserts("old", -1)),
+            (
+                "update",
+                "UPDATE OF start_time, venue_id, artist_id",
+                upserts("old", -1) + " " + upserts("new", 1),
+            ),
+        )
+    ]
+
+
+def register(Show, Rollup):
+    """Create the triggers keeping ``Rollup`` in sync whenever ``Show`` is.
+
+    Existing Postgres databases get the same triggers from the migrations.
+    """
+    shows, table = Show.__tablename__, Rollup.__tablename__
+    for statement in postgres_ddl(shows, table):
+        event.listen(
+            Show.__table__,
+            "after_create",
+            DDL(statement).execute_if(dialect="postgresql"),
+        )
+    for statement in sqlite_ddl(shows, table):
+        event.listen(
+            Show.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite")
+        )
+
+
+def truncate(day, bucket):
+    """Return the first day of the bucket holding ``day``."""
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, bucket):
+    if bucket == "week":
+        return day + timedelta(days=7)
+    if bucket == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def bucket_starts(start, end, bucket):
+    """First days of the buckets covering [start, end)."""
+    day = truncate(start, bucket)
+    while day < end:
+        yield day
+        day = next_bucket(day, bucket)
+
+
+def bucket_of(db, column, bucket):
+    """SQL expression for the first day of the bucket holding ``column``."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        # inlined, a bound name would differ between SELECT and GROUP BY
+        unit = literal_column(f"'{bucket}'")
+        return cast(func.date_trunc(unit, cast(column, DateTime)), Date)
+    if bucket == "week":
+        return type_coerce(func.date(column, "weekday 0", "-6 days"), Date)
+    if bucket == "month":
+        return type_coerce(func.date(column, "start of month"), Date)
+    return type_coerce(func.date(column), Date)
+
+
+def bucket_counts(db, Show, Rollup, kind, owner_id, bucket, start, end, rollup=True):
+    """Count the shows of one venue or artist per bucket.
+
+    Returns a list of (bucket start, shows) for every bucket overlapping
+    [start, end), empty ones included. The first and last buckets are
+    counted in full. With ``rollup`` False the shows are counted directly.
+    """
+    first = truncate(start, bucket)
+    last = truncate(end - timedelta(days=1), bucket)
+    stop = next_bucket(last, bucket)
+    if rollup:
+        day = Rollup.day
+        counted = func.sum(Rollup.shows)
+        where = and_(
+            Rollup.kind == kind,
+            Rollup.owner_id == owner_id,
+            Rollup.day >= first,
+            Rollup.day < stop,
+        )
+    else:
+        day = Show.start_time
+        counted = func.count(Show.id)
+        where = and_(
+            getattr(Show, KINDS[kind]) == owner_id,
+            Show.start_time >= datetime.combine(first, datetime.min.time()),
+            Show.start_time < datetime.combine(stop, datetime.min.time()),
+        )
+    starts = bucket_of(db, day, bucket)
+    counts = dict(
+        db.session.query(starts, counted).filter(where).group_by(starts).all()
+    )
+    return [(day, counts.get(day, 0)) for day in bucket_starts(first, stop, bucket)]
+
+
+def check_rollup(db, Show, Rollup, fix=False):
+    """Recompute the rollup from the shows.
+
+    Returns (kind, owner_id, day, stored, actual) for every row that
+    drifted, and rebuilds the table when ``fix``.
+    """
+    actual = dict()
+    for kind, column in KINDS.items():
+        owner = getattr(Show, column)
+        day = func.date(Show.start_time)
+        rows = db.session.query(owner, type_coerce(day, Date), func.count(Show.id))
+        for owner_id, show_day, shows in rows.group_by(owner, day):
+            actual[(kind, owner_id, show_day)] = shows
+    stored = {
+        (kind, owner_id, day): shows
+        for kind, owner_id, day, shows in db.session.query(
+            Rollup.kind, Rollup.owner_id, Rollup.day, Rollup.shows
+        ).filter(Rollup.shows != 0)
+    }
+    drift = sorted(
+        (*key, stored.get(key, 0), actual.get(key, 0))
+        for key in set(actual) | set(stored)
+        if stored.get(key, 0) != actual.get(key, 0)
+    )
+    if fix and drift:
+        db.session.execute(Rollup.__table__.delete())
+        db.session.execute(
+            Rollup.__table__.insert(),
+            [
+                {"kind": kind, "owner_id": owner_id, "day": day, "shows": shows}
+                for (kind, owner_id, day), shows in actual.items()
+            ],
+        )
+        db.session.commit()
+    return drift
@@ -3,17 +3,44 @@
 # ----------------------------------------------------------------------------#
 
 import json
+import time
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from flask import (
+    Flask,
+    render_template,
+    request,
+    Response,
+    flash,
+    redirect,
+    url_for,
+    jsonify,
+    abort,
+)
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+import search
+import facets
+import analytics
+import config
+import assets
+import scheduling
+from cache import ResponseCache
+from database import RoutingSQLAlchemy, primary
+from instrumentation import QueryInstrumentation
+from templating import Templates
 from flask_migrate import Migrate
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from collections import Counter
+from functools import lru_cache
+from itertools import groupby
+from sqlalchemy import event, false, func, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm.exc import StaleDataError
+import click
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -21,14 +48,29 @@ from datetime import datetime
 
 app = Flask(__name__)
 moment = Moment(app)
-app.config.from_object("config")
-db = SQLAlchemy(app)
+app.config.from_object(config.profile())
+if not app.config["SECRET_KEY"]:
+    raise RuntimeError("SECRET_KEY must be set, every worker has to share it")
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
+cache = ResponseCache(app)
+QueryInstrumentation(app)
+static_assets = assets.Assets(app)
+
+SHOWS_PER_PAGE = 30
+BROWSE_PER_PAGE = 30
+SEARCH_PER_PAGE = 30
+AUTOCOMPLETE_LIMIT = 10
+# ten years of day buckets
+ANALYTICS_MAX_BUCKETS = 3660
 
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
 
+# genres are a Postgres ARRAY, stored as JSON when testing against SQLite
+GENRES_TYPE = postgresql.ARRAY(db.String()).with_variant(db.JSON(), "sqlite")
+
 
 class Venue(db.Model):
     __tablename__ = "Venue"
@@ -41,14 +83,37 @@ class Venue(db.Model):
     phone = db.Column(db.String(120), nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column("genres", db.ARRAY(db.String()), nullable=False)
+    genres = db.Column("genres", GENRES_TYPE, nullable=False)
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
+    # maintained on write, see the Counters section
+    num_upcoming_shows = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    # set when the venue is deleted, the row is purged later, see Soft delete
+    deleted_at = db.Column(db.DateTime)
+    # bumped by every ORM update, guards edits against lost updates
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # shows go with the venue through ON DELETE CASCADE, never loaded for it
     shows = db.relationship(
-        "Show", cascade="save-update, merge, delete", backref="venue", lazy=True
+        "Show",
+        cascade="save-update, merge, delete",
+        passive_deletes=True,
+        backref="venue",
+        lazy=True,
     )
 
+    __table_args__ = (
+        db.Index("ix_Venue_genres", "genres", postgresql_using="gin"),
+        db.Index(
+            "ix_Venue_deleted_at",
+            "deleted_at",
+            postgresql_where=db.text("deleted_at IS NOT NULL"),
+        ),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
     def __repr__(self):
         return f"<Venue {self.id} - {self.name}>"
 
@@ -61,14 +126,23 @@ class Artist(db.Model):
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
-    genres = db.Column("genres", db.ARRAY(db.String()), nullable=False)
+    genres = db.Column("genres", GENRES_TYPE, nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    # maintained on write, see the Counters section
+    num_upcoming_shows = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    # bumped by every ORM update, guards edits against lost updates
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     shows = db.relationship("Show", backref="artist", lazy=True)
 
+    __table_args__ = (db.Index("ix_Artist_genres", "genres", postgresql_using="gin"),)
+    __mapper_args__ = {"version_id_col": version}
+
     def __repr__(self):
         return f"<Artist {self.id} - {self.name}>"
 
@@ -78,28 +152,494 @@ class Show(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"), nullable=False)
+    venue_id = db.Column(
+        db.Integer, db.ForeignKey("Venue.id", ondelete="CASCADE"), nullable=False
+    )
     start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # minutes the show occupies its venue and artist
+    duration = db.Column(
+        db.Integer,
+        nullable=False,
+        default=scheduling.DEFAULT_DURATION,
+        server_default=str(scheduling.DEFAULT_DURATION),
+    )
+    # whether the show is still counted in its venue and artist counters
+    is_upcoming = db.Column(
+        db.Boolean, nullable=False, default=False, server_default=false()
+    )
+
+    __table_args__ = (
+        db.Index("ix_Show_start_time_id", "start_time", "id"),
+        db.Index("ix_Show_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_Show_artist_id_start_time", "artist_id", "start_time"),
+        db.Index(
+            "ix_Show_upcoming_start_time",
+            "start_time",
+            postgresql_where=db.text("is_upcoming"),
+        ),
+    )
 
     def __repr__(self):
         return f"<Show {self.id} - Artist {self.artist_id} - Venue {self.venue_id}>"
 
 
+class ShowRollup(db.Model):
+    """Shows per venue and per artist per day, kept in sync by triggers."""
+
+    __tablename__ = "ShowRollup"
+
+    kind = db.Column(db.String(6), primary_key=True)
+    owner_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    shows = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ShowRollup {self.kind} {self.owner_id} - {self.day}: {self.shows}>"
+
+
+search.register(Venue)
+search.register(Artist)
+facets.register(db, cache, Venue)
+facets.register(db, cache, Artist)
+analytics.register(Show, ShowRollup)
+
+# ----------------------------------------------------------------------------#
+# Counters.
+# ----------------------------------------------------------------------------#
+
+# Venue.num_upcoming_shows and Artist.num_upcoming_shows count the shows
+# flagged is_upcoming. Shows are flagged when inserted and unflagged by the
+# periodic `flask rollover-shows` job once they start; `flask check-counters`
+# recomputes everything from scratch and reports drift.
+
+
+def adjust_upcoming_counts(connection, venue_id, artist_id, delta):
+    for model, model_id in ((Venue, venue_id), (Artist, artist_id)):
+        connection.execute(
+            model.__table__.update()
+            .where(model.id == model_id)
+            .values(num_upcoming_shows=model.num_upcoming_shows + delta)
+        )
+
+
+def count_upcoming(connection, rows):
+    """Add bulk written shows to the upcoming counters the ORM events skip.
+
+    Runs one executemany update per table, however many rows are counted.
+    """
+    for model, key in ((Venue, "venue_id"), (Artist, "artist_id")):
+        upcoming = Counter(row[key] for row in rows if row["is_upcoming"])
+        if upcoming:
+            connection.execute(
+                model.__table__.update()
+                .where(model.id == db.bindparam("model_id"))
+                .values(
+                    num_upcoming_shows=model.num_upcoming_shows + db.bindparam("delta")
+                ),
+                [{"model_id": i, "delta": n} for i, n in upcoming.items()],
+            )
+
+
+@event.listens_for(Show, "before_insert")
+def flag_upcoming_show(mapper, connection, show):
+    show.is_upcoming = bool(show.start_time and show.start_time > datetime.now())
+
+
+@event.listens_for(Show, "after_insert")
+def count_upcoming_show(mapper, connection, show):
+    if show.is_upcoming:
+        adjust_upcoming_counts(connection, show.venue_id, show.artist_id, 1)
+
+
+@event.listens_for(Show, "after_delete")
+def uncount_upcoming_show(mapper, connection, show):
+    if show.is_upcoming:
+        adjust_upcoming_counts(connection, show.venue_id, show.artist_id, -1)
+
+
+def roll_over_shows(now=None):
+    """Move shows that have started from upcoming to past, return how many."""
+    started = db.and_(Show.is_upcoming, Show.start_time <= (now or datetime.now()))
+    for model, show_fk in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        num_started = (
+            db.select([func.count(Show.id)])
+            .where(started)
+            .where(show_fk == model.id)
+            .as_scalar()
+        )
+        model.query.filter(model.id.in_(db.select([show_fk]).where(started))).update(
+            {model.num_upcoming_shows: model.num_upcoming_shows - num_started},
+            synchronize_session=False,
+        )
+    rolled = Show.query.filter(started).update(
+        {Show.is_upcoming: False}, synchronize_session=False
+    )
+    db.session.commit()
+    return rolled
+
+
+def check_upcoming_counts(fix=False):
+    """Recompute upcoming show counters from the Show table.
+
+    Returns a list of (table, id, stored, actual) tuples for every row whose
+    counter has drifted, and rewrites the counters and flags when ``fix``.
+    """
+    now = datetime.now()
+    drift = list()
+    # shows of soft deleted venues are no longer counted anywhere
+    live = Show.venue_id.notin_(
+        db.select([Venue.id]).where(Venue.deleted_at.isnot(None))
+    )
+    for model, show_fk in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        actual = func.count(Show.id).filter(Show.start_time > now)
+        rows = (
+            db.session.query(model.id, model.num_upcoming_shows, actual)
+            .outerjoin(Show, db.and_(show_fk == model.id, live))
+            .group_by(model.id)
+            .having(actual != model.num_upcoming_shows)
+            .all()
+        )
+        drift.extend((model.__tablename__, *row) for row in rows)
+    if fix and drift:
+        Show.query.update(
+            {Show.is_upcoming: db.and_(Show.start_time > now, live)},
+            synchronize_session=False,
+        )
+        for model, show_fk in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+            model.query.update(
+                {
+                    model.num_upcoming_shows: db.select([func.count(Show.id)])
+                    .where(Show.is_upcoming)
+                    .where(show_fk == model.id)
+                    .as_scalar()
+                },
+                synchronize_session=False,
+            )
+        db.session.commit()
+    return drift
+
+
+@app.cli.command("rollover-shows")
+def rollover_shows_command():
+    """Move started shows out of the upcoming counters (run from cron)."""
+    click.echo(f"{roll_over_shows()} shows moved from upcoming to past")
+
+
+@app.cli.command("check-counters")
+@click.option("--fix", is_flag=True, help="Rewrite counters that have drifted.")
+def check_counters_command(fix):
+    """Recompute upcoming show counters and report drift."""
+    drift = check_upcoming_counts(fix=fix)
+    for table, row_id, stored, actual in drift:
+        click.echo(f"{table} {row_id}: stored {stored}, actual {actual}")
+    click.echo(f"{len(drift)} counters drifted" + (", fixed" if fix and drift else ""))
+
+
+@app.cli.command("check-rollup")
+@click.option("--fix", is_flag=True, help="Rebuild the rollup if it has drifted.")
+def check_rollup_command(fix):
+    """Recompute the per day show counts from the Show table and report drift."""
+    drift = analytics.check_rollup(db, Show, ShowRollup, fix=fix)
+    for kind, owner_id, day, stored, actual in drift:
+        click.echo(f"{kind} {owner_id} on {day}: stored {stored}, actual {actual}")
+    click.echo(f"{len(drift)} days drifted" + (", rebuilt" if fix and drift else ""))
+
+
+# ----------------------------------------------------------------------------#
+# Soft delete.
+# ----------------------------------------------------------------------------#
+
+# Deleting a venue only stamps deleted_at, which every read path filters on,
+# and takes its upcoming shows out of the artist counters. The rows are
+# removed later by `flask purge-venues`, in small committed batches.
+
+
+def soft_delete_venue(venue, now=None):
+    """Hide ``venue`` and stop counting its upcoming shows."""
+    upcoming = db.and_(Show.venue_id == venue.id, Show.is_upcoming)
+    per_artist = (
+        db.session.query(Show.artist_id, func.count(Show.id))
+        .filter(upcoming)
+        .group_by(Show.artist_id)
+        .all()
+    )
+    if per_artist:
+        db.session.execute(
+            Artist.__table__.update()
+            .where(Artist.id == db.bindparam("model_id"))
+            .values(
+                num_upcoming_shows=Artist.num_upcoming_shows - db.bindparam("delta")
+            ),
+            [{"model_id": i, "delta": n} for i, n in per_artist],
+        )
+    Show.query.filter(upcoming).update(
+        {Show.is_upcoming: False}, synchronize_session=False
+    )
+    venue.num_upcoming_shows = 0
+    venue.deleted_at = now or datetime.now()
+
+
+def purge_deleted_venues(batch_size=1000, report=None):
+    """Hard delete soft deleted venues and their shows, return how many.
+
+    Shows are deleted ``batch_size`` at a time with one set-based DELETE and
+    a commit per batch, so no transaction holds locks for long. Progress is
+    committed as it goes: if the purge stops, running it again carries on
+    with whatever is left.
+    """
+    purged = 0
+    deleted = (
+        db.session.query(Venue.id)
+        .filter(Venue.deleted_at.isnot(None))
+        .order_by(Venue.deleted_at, Venue.id)
+        .all()
+    )
+    for (venue_id,) in deleted:
+        total = Show.query.filter_by(venue_id=venue_id).count()
+        done = 0
+        while True:
+            batch = db.select([Show.id]).where(Show.venue_id == venue_id)
+            removed = Show.query.filter(Show.id.in_(batch.limit(batch_size))).delete(
+                synchronize_session=False
+            )
+            db.session.commit()
+            if not removed:
+                break
+            done += removed
+            if report:
+                report(venue_id, done, total)
+        # ON DELETE CASCADE removes any show added since the count
+        Venue.query.filter_by(id=venue_id).delete(synchronize_session=False)
+        db.session.commit()
+        purged += 1
+    return purged
+
+
+@app.cli.command("purge-venues")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--interval", type=float, help="keep running, polling every N seconds")
+def purge_venues_command(batch_size, interval):
+    """Hard delete soft deleted venues and their shows (run as a worker)."""
+
+    def report(venue_id, done, total):
+        click.echo(f"venue {venue_id}: {done}/{total} shows purged")
+
+    while True:
+        purged = purge_deleted_venues(batch_size, report)
+        if purged:
+            click.echo(f"{purged} venues purged")
+        if interval is None:
+            break
+        time.sleep(interval)
+
+
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format="medium"):
-    date = dateutil.parser.parse(value)
-    if format == "full":
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == "medium":
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    "full": "EEEE MMMM, d, y 'at' h:mma",
+    "medium": "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+    """Parse a named or custom babel pattern and its locale only once."""
+    pattern = babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+    return pattern, babel.Locale.parse(locale)
+
+
+@lru_cache(maxsize=4096)
+def cached_format_datetime(value, format, locale):
+    pattern, locale = datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format="medium", locale=None):
+    # accept datetime objects directly, strings are still parsed for old callers
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return cached_format_datetime(value, format, locale or babel.dates.LC_TIME)
 
 
 app.jinja_env.filters["datetime"] = format_datetime
+# after the filters, templates using them are compiled here in production
+templates = Templates(app)
+
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    """Fingerprint, minify and precompress static/ for deployment."""
+    build_dir = app.config["ASSETS_BUILD_DIR"]
+    manifest = assets.build(app.static_folder, build_dir)
+    static_assets.load(build_dir)
+    click.echo(f"{len(manifest)} assets built into {build_dir}")
+
+
+# ----------------------------------------------------------------------------#
+# Helpers.
+# ----------------------------------------------------------------------------#
+
+
+def split_shows(rows):
+    """Split show rows carrying an ``upcoming`` flag into (upcoming, past)."""
+    upcoming = list()
+    past = list()
+    for row in rows:
+        show = row._asdict()
+        if show.pop("upcoming"):
+            upcoming.append(show)
+        else:
+            past.append(show)
+    return upcoming, past
+
+
+def get_venue_or_404(venue_id):
+    """Return the venue unless it is missing or soft deleted."""
+    # get() reuses a venue already in the session without a query
+    venue = Venue.query.get_or_404(venue_id)
+    if venue.deleted_at is not None:
+        abort(404)
+    return venue
+
+
+class EditConflict(Exception):
+    pass
+
+
+def save_edit(instance, values, version):
+    """Write the ``values`` that differ from ``instance`` and commit.
+
+    Returns the names of the changed columns; when there are none nothing
+    is written. The UPDATE sets only the changed columns and matches the
+    row's version, so an edit loaded at ``version`` raises EditConflict
+    instead of overwriting a change made since, whether that change was
+    committed before this request read the row or while it ran.
+    """
+    if version and int(version) != instance.version:
+        raise EditConflict
+    # empty form fields leave NULL columns as they are
+    changed = {
+        name: value
+        for name, value in values.items()
+        if (getattr(instance, name) or None) != (value or None)
+    }
+    for name, value in changed.items():
+        setattr(instance, name, value)
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        raise EditConflict
+    return list(changed)
+
+
+def search_results(model):
+    """One page of the best matches for the form's search_term and their count.
+
+    The form's ``page`` picks the page. The count needs a query of its own
+    only when the first page is full.
+    """
+    search_term = request.form.get("search_term", "")
+    page = max(request.form.get("page", 1, type=int), 1)
+    rows = search.ranked_search(
+        db, model, search_term, SEARCH_PER_PAGE, (page - 1) * SEARCH_PER_PAGE
+    )
+    if page == 1 and len(rows) < SEARCH_PER_PAGE:
+        count = len(rows)
+    else:
+        count = search.count_matches(db, model, search_term)
+    return {
+        "count": count,
+        "page": page,
+        "next_page": page + 1 if page * SEARCH_PER_PAGE < count else None,
+        "data": [
+            {"id": id, "name": name, "num_upcoming_shows": num_upcoming_shows}
+            for id, name, num_upcoming_shows in rows
+        ],
+    }
+
+
+def autocomplete(model):
+    """Up to AUTOCOMPLETE_LIMIT {"id", "name"} matches for the ?q= prefix."""
+    prefix = request.args.get("q", "").strip()
+    if not prefix:
+        return {"results": []}
+    rows = search.prefix_search(db, model, prefix, AUTOCOMPLETE_LIMIT)
+    return {"results": [{"id": id, "name": name} for id, name in rows]}
+
+
+def browse(model):
+    """Facet counts and one page of ``model`` rows for the request's filters.
+
+    Filters: ?genre=<genre> (repeatable, all must match), ?state=, ?city=.
+    """
+    genres = request.args.getlist("genre")
+    state = request.args.get("state")
+    city = request.args.get("city")
+    page = request.args.get("page", 1, type=int)
+    counts = facets.count_facets(db, cache, model, genres, state, city)
+    rows = (
+        db.session.query(
+            model.id,
+            model.name,
+            model.city,
+            model.state,
+            model.genres,
+            model.num_upcoming_shows,
+        )
+        .filter(*facets.filters(db, model, genres, state, city))
+        .order_by(model.name, model.id)
+        .offset((page - 1) * BROWSE_PER_PAGE)
+        .limit(BROWSE_PER_PAGE)
+        .all()
+    )
+    return {
+        "facets": counts,
+        # every matching row has exactly one state
+        "count": sum(counts["state"].values()),
+        "page": page,
+        "data": [row._asdict() for row in rows],
+    }
+
+
+def show_counts(kind, owner_id):
+    """JSON show counts of a venue or artist per ?bucket=day|week|month.
+
+    Covers ?start= to ?end= (ISO dates, end excluded), one year from today
+    by default, and lists every bucket, so weeks without shows show up as 0.
+    """
+    bucket = request.args.get("bucket", "week")
+    start = request.args.get("start", date.today(), type=date.fromisoformat)
+    end = request.args.get("end", start + timedelta(days=365), type=date.fromisoformat)
+    if bucket not in analytics.BUCKETS or end <= start:
+        return jsonify({"success": False, "message": "invalid bucket or range"}), 400
+    if (end - start).days / {"day": 1, "week": 7, "month": 28}[bucket] > (
+        ANALYTICS_MAX_BUCKETS
+    ):
+        return jsonify({"success": False, "message": "too many buckets"}), 400
+    counts = analytics.bucket_counts(
+        db, Show, ShowRollup, kind, owner_id, bucket, start, end
+    )
+    return jsonify(
+        {
+            f"{kind}_id": owner_id,
+            "bucket": bucket,
+            "total": sum(shows for _, shows in counts),
+            "buckets": [
+                {"start": day.isoformat(), "shows": shows} for day, shows in counts
+            ],
+        }
+    )
+
+
+def parse_cursor(value):
+    """Parse a "<start_time>_<id>" /shows cursor into a (start_time, id) key."""
+    start_time, show_id = value.rsplit("_", 1)
+    return datetime.fromisoformat(start_time), int(show_id)
+
 
 # ----------------------------------------------------------------------------#
 # Controllers.
@@ -116,37 +656,34 @@ def index():
 
 
 @app.route("/venues")
+@cache.page(lambda: ["venues"])
 def venues():
-    # create the data list
+    # venues with their upcoming show counter, ordered by location
+    rows = (
+        db.session.query(
+            Venue.id, Venue.name, Venue.city, Venue.state, Venue.num_upcoming_shows
+        )
+        .filter(Venue.deleted_at.is_(None))
+        .order_by(Venue.state, Venue.city, Venue.id)
+        .all()
+    )
+    # rows are ordered by location so each area is a contiguous run
     data = list()
-    # get all venues
-    venues = Venue.query.all()
-    # get unique city and states combination for each available venue
-    venue_locations = set()
-    for v in venues:
-        venue_locations.add((v.city, v.state))
-    # add cities and states to data
-    for loc in venue_locations:
-        data.append({"city": loc[0], "state": loc[1], "venues": []})
-    # add the rest of the info to the data
-    for v in venues:
-        num_upcoming_shows = 0
-        # get all shows in venue
-        shows = Show.query.filter_by(venue_id=v.id).all()
-        # increment upcoming shows
-        for s in shows:
-            if s.start_time > datetime.now():
-                num_upcoming_shows += 1
-        # add venues to data
-        for d in data:
-            if v.city == d["city"] and v.state == d["state"]:
-                d["venues"].append(
+    for (city, state), area in groupby(rows, key=lambda r: (r.city, r.state)):
+        data.append(
+            {
+                "city": city,
+                "state": state,
+                "venues": [
                     {
                         "id": v.id,
                         "name": v.name,
-                        "num_upcoming_shows": num_upcoming_shows,
+                        "num_upcoming_shows": v.num_upcoming_shows,
                     }
-                )
+                    for v in area
+                ],
+            }
+        )
 
     return render_template("pages/venues.html", areas=data)
 
@@ -155,61 +692,51 @@ def venues():
 def search_venues():
     # user search term
     search_term = request.form.get("search_term", "")
-    # find all venues matching search term (partial and case insensitivity included)
-    venues = Venue.query.filter(Venue.name.ilike(f"%{search_term}%")).all()
-    response = {"count": len(venues), "data": []}
-
-    for v in venues:
-        num_upcoming_shows = 0
-        # get all shows in venue
-        shows = Show.query.filter_by(venue_id=v.id).all()
-        # increment upcoming shows
-        for s in shows:
-            if s.start_time > datetime.now():
-                num_upcoming_shows += 1
-        # add venues to response
-        response["data"].append(
-            {"id": v.id, "name": v.name, "num_upcoming_shows": num_upcoming_shows,}
-        )
+    # one page of venues matching search term, best matches first
+    # (partial and case insensitivity included)
+    response = search_results(Venue)
     # return response with search results
     return render_template(
-        "pages/search_venues.html",
-        results=response,
-        search_term=request.form.get("search_term", ""),
+        "pages/search_venues.html", results=response, search_term=search_term,
     )
 
 
+@app.route("/venues/browse")
+def browse_venues():
+    # filtered venues with genre/state/city facet counts, as JSON
+    return jsonify(browse(Venue))
+
+
+@app.route("/venues/autocomplete")
+def autocomplete_venues():
+    # venues whose name starts with ?q=, for the show form's venue picker
+    return jsonify(autocomplete(Venue))
+
+
 @app.route("/venues/<int:venue_id>")
+@cache.page(lambda venue_id: [f"venue:{venue_id}", "artists"])
 def show_venue(venue_id):
     # get venue info using venue_id
-    venue = Venue.query.get(venue_id)
-    # get all shows for the given venue
-    shows = Show.query.filter_by(venue_id=venue_id).all()
+    venue = get_venue_or_404(venue_id)
+    # get all shows for the given venue together with their artist info
+    shows = (
+        db.session.query(
+            Show.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+            Show.start_time,
+            (Show.start_time > datetime.now()).label("upcoming"),
+        )
+        .join(Artist, Show.artist_id == Artist.id)
+        .filter(Show.venue_id == venue_id)
+        .order_by(Show.start_time)
+        .all()
+    )
     # get past and upcoming show info and count
-    upcoming = list()
-    past = list()
-    for s in shows:
-        artist = Artist.query.get(s.artist_id)
-        artist_name = artist.name
-        artist_image_link = artist.image_link
-        if s.start_time > datetime.now():
-            upcoming.append(
-                {
-                    "artist_id": s.artist_id,
-                    "artist_name": artist_name,
-                    "artist_image_link": artist_image_link,
-                    "start_time": format_datetime(str(s.start_time)),
-                }
-            )
-        else:
-            past.append(
-                {
-                    "artist_id": s.artist_id,
-                    "artist_name": artist_name,
-                    "artist_image_link": artist_image_link,
-                    "start_time": format_datetime(str(s.start_time)),
-                }
-            )
+    upcoming, past = split_shows(shows)
+    # the cached page goes stale once the next show starts
+    if upcoming:
+        cache.expire_at(upcoming[0]["start_time"])
     # add show data to venue
     venue.past_shows = past
     venue.upcoming_shows = upcoming
@@ -219,6 +746,12 @@ def show_venue(venue_id):
     return render_template("pages/show_venue.html", venue=venue)
 
 
+@app.route("/venues/<int:venue_id>/analytics")
+def venue_analytics(venue_id):
+    get_venue_or_404(venue_id)
+    return show_counts("venue", venue_id)
+
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -252,6 +785,7 @@ def create_venue_submission():
         # add venue to session and commit to database
         db.session.add(venue)
         db.session.commit()
+        cache.invalidate("venues")
         # flash success message if there are no errors
         flash("The Venue " + request.form["name"] + " was submitted successfully!")
     except:
@@ -266,19 +800,23 @@ def create_venue_submission():
 
 
 @app.route("/venues/<int:venue_id>/delete")
+@primary
 def delete_venue(venue_id):
     try:
         # get venue using venue_id
-        venue = Venue.query.get(venue_id)
-        # delete venue
-        db.session.delete(venue)
+        venue = Venue.query.filter_by(id=venue_id, deleted_at=None).one()
+        # hide the venue now, its shows are purged in the background
+        soft_delete_venue(venue)
         db.session.commit()
+        cache.invalidate("venues", f"venue:{venue_id}")
         # flash message if deletion was successful
         flash("The Venue " + venue.name + " was deleted successfully!")
     except:
         db.session.rollback()
         flash(
-            "The Venue with id [" + venue_id + "] was not be deleted due to an error."
+            "The Venue with id ["
+            + str(venue_id)
+            + "] was not be deleted due to an error."
         )
     finally:
         db.session.close()
@@ -289,6 +827,7 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route("/artists")
+@cache.page(lambda: ["artists"])
 def artists():
     data = list()
     # get all the artists from db
@@ -303,61 +842,51 @@ def artists():
 def search_artists():
     # user search term
     search_term = request.form.get("search_term", "")
-    # find all artists matching search term (partial and case insensitivity included)
-    artists = Artist.query.filter(Artist.name.ilike(f"%{search_term}%")).all()
-    response = {"count": len(artists), "data": []}
-
-    for a in artists:
-        num_upcoming_shows = 0
-        # get all shows by the artist
-        shows = Show.query.filter_by(artist_id=a.id).all()
-        # increment upcoming shows
-        for s in shows:
-            if s.start_time > datetime.now():
-                num_upcoming_shows += 1
-        # add artists to the response
-        response["data"].append(
-            {"id": a.id, "name": a.name, "num_upcoming_shows": num_upcoming_shows,}
-        )
+    # one page of artists matching search term, best matches first
+    # (partial and case insensitivity included)
+    response = search_results(Artist)
     # return response with search results
     return render_template(
-        "pages/search_artists.html",
-        results=response,
-        search_term=request.form.get("search_term", ""),
+        "pages/search_artists.html", results=response, search_term=search_term,
     )
 
 
+@app.route("/artists/browse")
+def browse_artists():
+    # filtered artists with genre/state/city facet counts, as JSON
+    return jsonify(browse(Artist))
+
+
+@app.route("/artists/autocomplete")
+def autocomplete_artists():
+    # artists whose name starts with ?q=, for the show form's artist picker
+    return jsonify(autocomplete(Artist))
+
+
 @app.route("/artists/<int:artist_id>")
+@cache.page(lambda artist_id: [f"artist:{artist_id}", "venues"])
 def show_artist(artist_id):
     # get artist info using artist_id
-    artist = Artist.query.get(artist_id)
-    # get all shows by the given artist
-    shows = Show.query.filter_by(artist_id=artist_id).all()
+    artist = Artist.query.get_or_404(artist_id)
+    # get all shows by the given artist together with their venue info
+    shows = (
+        db.session.query(
+            Show.venue_id,
+            Venue.name.label("venue_name"),
+            Venue.image_link.label("venue_image_link"),
+            Show.start_time,
+            (Show.start_time > datetime.now()).label("upcoming"),
+        )
+        .join(Venue, Show.venue_id == Venue.id)
+        .filter(Show.artist_id == artist_id, Venue.deleted_at.is_(None))
+        .order_by(Show.start_time)
+        .all()
+    )
     # get past and upcoming show info and count
-    upcoming = list()
-    past = list()
-    for s in shows:
-        venue = Venue.query.get(s.venue_id)
-        venue_name = venue.name
-        venue_image_link = venue.image_link
-        if s.start_time > datetime.now():
-            upcoming.append(
-                {
-                    "venue_id": s.venue_id,
-                    "venue_name": venue_name,
-                    "venue_image_link": venue_image_link,
-                    "start_time": format_datetime(str(s.start_time)),
-                }
-            )
-        else:
-            past.append(
-                {
-                    "venue_id": s.venue_id,
-                    "venue_name": venue_name,
-                    "venue_image_link": venue_image_link,
-                    "start_time": format_datetime(str(s.start_time)),
-                }
-            )
+    upcoming, past = split_shows(shows)
+    # the cached page goes stale once the next show starts
+    if upcoming:
+        cache.expire_at(upcoming[0]["start_time"])
     # add show data to artist
     artist.past_shows = past
     artist.upcoming_shows = upcoming
@@ -367,19 +896,32 @@ def show_artist(artist_id):
     return render_template("pages/show_artist.html", artist=artist)
 
 
+@app.route("/artists/<int:artist_id>/analytics")
+def artist_analytics(artist_id):
+    Artist.query.get_or_404(artist_id)
+    return show_counts("artist", artist_id)
+
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route("/artists/<int:artist_id>/edit", methods=["GET"])
 def edit_artist(artist_id):
-    form = ArtistForm()
     # get artist info using artist_id
-    artist = Artist.query.get(artist_id)
+    artist = Artist.query.get_or_404(artist_id)
+    return render_artist_form(artist)
+
+
+def render_artist_form(artist, status=200):
+    form = ArtistForm()
     # artist data
     theartist = {"id": artist.id, "name": artist.name}
     # Populate the edit form
     form.process(obj=artist)
 
-    return render_template("forms/edit_artist.html", form=form, artist=theartist)
+    return (
+        render_template("forms/edit_artist.html", form=form, artist=theartist),
+        status,
+    )
 
 
 @app.route("/artists/<int:artist_id>/edit", methods=["POST"])
@@ -388,20 +930,37 @@ def edit_artist_submission(artist_id):
         form = ArtistForm()
         # get artist info using artist_id
         artist = Artist.query.get(artist_id)
-        # update artist using form data
-        artist.name = form.name.data
-        artist.genres = form.genres.data
-        artist.city = form.city.data
-        artist.state = form.state.data
-        artist.phone = form.phone.data
-        artist.facebook_link = form.facebook_link.data
-        artist.image_link = form.image_link.data
-        artist.website = form.website.data
-        artist.seeking_venue = True if form.seeking_venue.data == "Yes" else False
-        artist.seeking_description = form.seeking_description.data
-        # commit changes
-        db.session.commit()
-        flash("The Artist " + request.form["name"] + " was updated successfully!")
+        # update the columns the form changed
+        changed = save_edit(
+            artist,
+            {
+                "name": form.name.data,
+                "genres": form.genres.data,
+                "city": form.city.data,
+                "state": form.state.data,
+                "phone": form.phone.data,
+                "facebook_link": form.facebook_link.data,
+                "image_link": form.image_link.data,
+                "website": form.website.data,
+                "seeking_venue": form.seeking_venue.data == "Yes",
+                "seeking_description": form.seeking_description.data,
+            },
+            form.version.data,
+        )
+        if changed:
+            cache.invalidate("artists", f"artist:{artist_id}")
+            flash("The Artist " + request.form["name"] + " was updated successfully!")
+        else:
+            flash("The Artist " + request.form["name"] + " was not changed.")
+    except EditConflict:
+        # show the current details, the editor decides what to apply again
+        flash(
+            "The Artist "
+            + request.form["name"]
+            + " was changed by someone else while you were editing it."
+            + " Please review the current details and apply your changes again."
+        )
+        return render_artist_form(Artist.query.get_or_404(artist_id), 409)
     except:
         db.session.rollback()
         flash(
@@ -417,15 +976,22 @@ def edit_artist_submission(artist_id):
 
 @app.route("/venues/<int:venue_id>/edit", methods=["GET"])
 def edit_venue(venue_id):
-    form = VenueForm()
     # get venue info using venue_id
-    venue = Venue.query.get(venue_id)
+    venue = get_venue_or_404(venue_id)
+    return render_venue_form(venue)
+
+
+def render_venue_form(venue, status=200):
+    form = VenueForm()
     # venue data
     thevenue = {"id": venue.id, "name": venue.name}
     # Populate the edit form
     form.process(obj=venue)
 
-    return render_template("forms/edit_venue.html", form=form, venue=thevenue)
+    return (
+        render_template("forms/edit_venue.html", form=form, venue=thevenue),
+        status,
+    )
 
 
 @app.route("/venues/<int:venue_id>/edit", methods=["POST"])
@@ -433,22 +999,39 @@ def edit_venue_submission(venue_id):
     try:
         form = VenueForm()
         # get venue info using venue_id
-        venue = Venue.query.get(venue_id)
-        # update venue using form data
-        venue.name = form.name.data
-        venue.genres = form.genres.data
-        venue.city = form.city.data
-        venue.state = form.state.data
-        venue.address = form.address.data
-        venue.phone = form.phone.data
-        venue.facebook_link = form.facebook_link.data
-        venue.website = form.website.data
-        venue.image_link = form.image_link.data
-        venue.seeking_talent = True if form.seeking_talent.data == "Yes" else False
-        venue.seeking_description = form.seeking_description.data
-        # commit changes
-        db.session.commit()
-        flash("The Venue " + request.form["name"] + " was updated successfully!")
+        venue = Venue.query.filter_by(id=venue_id, deleted_at=None).one()
+        # update the columns the form changed
+        changed = save_edit(
+            venue,
+            {
+                "name": form.name.data,
+                "genres": form.genres.data,
+                "city": form.city.data,
+                "state": form.state.data,
+                "address": form.address.data,
+                "phone": form.phone.data,
+                "facebook_link": form.facebook_link.data,
+                "website": form.website.data,
+                "image_link": form.image_link.data,
+                "seeking_talent": form.seeking_talent.data == "Yes",
+                "seeking_description": form.seeking_description.data,
+            },
+            form.version.data,
+        )
+        if changed:
+            cache.invalidate("venues", f"venue:{venue_id}")
+            flash("The Venue " + request.form["name"] + " was updated successfully!")
+        else:
+            flash("The Venue " + request.form["name"] + " was not changed.")
+    except EditConflict:
+        # show the current details, the editor decides what to apply again
+        flash(
+            "The Venue "
+            + request.form["name"]
+            + " was changed by someone else while you were editing it."
+            + " Please review the current details and apply your changes again."
+        )
+        return render_venue_form(get_venue_or_404(venue_id), 409)
     except:
         db.session.rollback()
         flash("The Venue " + request.form["name"] + " was not updated due to an error.")
@@ -490,6 +1073,7 @@ def create_artist_submission():
         # add artist to session and commit to database
         db.session.add(artist)
         db.session.commit()
+        cache.invalidate("artists")
         # flash success message if there are no errors
         flash("The Artist " + request.form["name"] + " was submitted successfully!")
     except:
@@ -510,26 +1094,48 @@ def create_artist_submission():
 
 @app.route("/shows")
 def shows():
-    # get all shows
-    shows = Show.query.all()
-    data = list()
-    # get the venue and artist info for each show
-    for s in shows:
-        artist = Artist.query.get(s.artist_id)
-        artist_name = artist.name
-        artist_image_link = artist.image_link
-        data.append(
-            {
-                "venue_id": s.venue_id,
-                "venue_name": Venue.query.get(s.venue_id).name,
-                "artist_id": s.artist_id,
-                "artist_name": artist_name,
-                "artist_image_link": artist_image_link,
-                "start_time": format_datetime(str(s.start_time)),
-            }
+    # optional filters: ?when=upcoming|past&start=<date>&end=<date>
+    when = request.args.get("when")
+    start = request.args.get("start", type=datetime.fromisoformat)
+    end = request.args.get("end", type=datetime.fromisoformat)
+    cursor = request.args.get("cursor", type=parse_cursor)
+    # select only the columns the template uses, venue and artist joined in
+    query = (
+        db.session.query(
+            Show.id,
+            Show.venue_id,
+            Venue.name.label("venue_name"),
+            Show.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+            Show.start_time,
         )
-
-    return render_template("pages/shows.html", shows=data)
+        .join(Venue, Show.venue_id == Venue.id)
+        .join(Artist, Show.artist_id == Artist.id)
+        .filter(Venue.deleted_at.is_(None))
+    )
+    if when == "upcoming":
+        query = query.filter(Show.start_time > datetime.now())
+    elif when == "past":
+        query = query.filter(Show.start_time <= datetime.now())
+    if start:
+        query = query.filter(Show.start_time >= start)
+    if end:
+        query = query.filter(Show.start_time < end)
+    # keyset pagination: continue after the last (start_time, id) seen
+    if cursor:
+        query = query.filter(tuple_(Show.start_time, Show.id) > tuple_(*cursor))
+    rows = query.order_by(Show.start_time, Show.id).limit(SHOWS_PER_PAGE + 1).all()
+    data = [row._asdict() for row in rows[:SHOWS_PER_PAGE]]
+    # link to the next page only if there is one
+    next_url = None
+    if len(rows) > SHOWS_PER_PAGE:
+        last = data[-1]
+        args = request.args.to_dict()
+        args["cursor"] = f"{last['start_time'].isoformat()}_{last['id']}"
+        next_url = url_for("shows", **args)
+
+    return render_template("pages/shows.html", shows=data, when=when, next_url=next_url)
 
 
 @app.route("/shows/create")
@@ -544,17 +1150,37 @@ def create_show_submission():
     try:
         # get form submitted data
         form = ShowForm()
-        # create object
-        show = Show(
-            artist_id=form.artist_id.data,
-            venue_id=form.venue_id.data,
-            start_time=form.start_time.data,
+        # check the slot is free for both the venue and the artist
+        rows, conflicts = scheduling.schedule(
+            db,
+            Show,
+            Venue,
+            Artist,
+            [
+                {
+                    "artist_id": form.artist_id.data,
+                    "venue_id": form.venue_id.data,
+                    "start_time": form.start_time.data,
+                    "duration": form.duration.data,
+                }
+            ],
         )
-        # add show to session and commit to database
-        db.session.add(show)
-        db.session.commit()
-        # flash success message if there are no errors
-        flash("The show was submitted successfully!")
+        if conflicts:
+            db.session.rollback()
+            flash(
+                "The Show was not submitted: "
+                + scheduling.REASONS[conflicts[0]["reason"]]
+                + "."
+            )
+        else:
+            # create object
+            show = Show(**rows[0])
+            # add show to session and commit to database
+            db.session.add(show)
+            db.session.commit()
+            cache.invalidate(f"venue:{show.venue_id}", f"artist:{show.artist_id}")
+            # flash success message if there are no errors
+            flash("The show was submitted successfully!")
     except:
         db.session.rollback()
         flash("The Show was not submitted due to an error.")
@@ -564,6 +1190,58 @@ def create_show_submission():
     return render_template("pages/home.html")
 
 
+@app.route("/shows/schedule", methods=["POST"])
+def schedule_shows():
+    """Book many shows at once.
+
+    Takes {"bookings": [{"artist_id", "venue_id", "start_time", "duration"}]}
+    and inserts every booking that does not overlap an existing show (or an
+    earlier booking) of the same venue or artist, in one transaction. The
+    others are returned in "conflicts".
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("bookings"), list):
+        return jsonify({"success": False, "message": "expected a bookings list"}), 400
+    try:
+        rows, conflicts = scheduling.schedule(db, Show, Venue, Artist, body["bookings"])
+        if rows:
+            # one executemany instead of an ORM flush per show
+            db.session.execute(Show.__table__.insert(), rows)
+            count_upcoming(db.session.connection(), rows)
+        db.session.commit()
+    except:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+    if rows:
+        cache.invalidate(
+            *{f"venue:{row['venue_id']}" for row in rows},
+            *{f"artist:{row['artist_id']}" for row in rows},
+        )
+    return jsonify(
+        {"success": not conflicts, "scheduled": len(rows), "conflicts": conflicts,}
+    )
+
+
+@app.route("/metrics/cache")
+def cache_metrics():
+    # page cache hit/miss counters for this worker
+    return jsonify(cache.stats())
+
+
+@app.route("/metrics/pool")
+def pool_metrics():
+    # connection pool usage of this worker, to size pools and worker counts
+    return jsonify(db.pool_stats())
+
+
+@app.route("/metrics/templates")
+def template_metrics():
+    # render time per page template for this worker
+    return jsonify(templates.stats())
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template("errors/404.html"), 404
@@ -0,0 +1,226 @@
+"""Fingerprinted, minified and precompressed static assets.
+
+``build()`` copies every file under ``static/`` into the build directory as
+``<name>.<hash>.<ext>``. Stylesheets are minified (scripts too when
+``rjsmin`` is installed) and their ``url()`` references rewritten to the
+hashed names. Text files get ``.gz`` siblings, plus ``.br`` ones when the
+``brotli`` package is installed, and the mapping from source to hashed name
+is written to ``manifest.json``. Run it with ``flask build-assets`` before
+deploying. Only ``static/`` is built: ``templates/pages/home.css`` is not
+linked from any page or served, so it is left out.
+
+``Assets`` loads that manifest and adds an ``asset_url()`` Jinja helper
+returning the hashed URL, or the plain ``/static`` one for files that were
+not built (e.g. in development). A hashed file never changes, so it is
+served with a one year ``immutable`` Cache-Control and repeat page loads
+make no static requests at all. Set ``ASSETS_URL`` to have nginx or a CDN
+serve the build directory instead of the Flask workers. Builds only ever
+add files, so pages cached before a deploy still find their assets.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+try:
+    import rcssmin
+except ImportError:  # pragma: no cover - rcssmin is optional
+    rcssmin = None
+try:
+    import rjsmin
+except ImportError:  # pragma: no cover - rjsmin is optional
+    rjsmin = None
+
+MANIFEST = "manifest.json"
+MAX_AGE = 365 * 24 * 60 * 60
+# images and woff fonts are compressed already
+COMPRESSIBLE = (".css", ".js", ".map", ".svg", ".json", ".eot", ".ttf", ".otf")
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+# quoted strings and unquoted url() values, kept as they are, and comments
+CSS_TOKEN = re.compile(
+    r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|url\(\s*[^\s'")][^)]*\)|/\*.*?\*/)""",
+    re.S,
+)
+
+
+def fingerprint(path, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+def minify_css_code(text):
+    text = re.sub(r"\s+", " ", text)
+    return re.sub(r"\s*([{};,>])\s*", r"\1", text)
+
+
+def minify_css(text):
+    """Drop comments, except /*! license */ ones, and collapse whitespace.
+
+    Strings and url() values are copied unchanged.
+    """
+    if rcssmin is not None:
+        return rcssmin.cssmin(text, keep_bang_comments=True)
+    minified = list()
+    code = list()
+    # odd parts are the tokens matched by CSS_TOKEN
+    for i, part in enumerate(CSS_TOKEN.split(text)):
+        if i % 2 == 0:
+            code.append(part)
+        elif part.startswith("/*") and not part.startswith("/*!"):
+            code.append(" ")
+        else:
+            minified.append(minify_css_code("".join(code)))
+            minified.append(part)
+            code = list()
+    minified.append(minify_css_code("".join(code)))
+    return "".join(minified).strip()
+
+
+def minify(path, content):
+    if ".min." in path:
+        return content
+    if path.endswith(".css"):
+        return minify_css(content.decode("utf-8")).encode("utf-8")
+    if path.endswith(".js") and rjsmin is not None:
+        return rjsmin.jsmin(content.decode("utf-8")).encode("utf-8")
+    return content
+
+
+def rewrite_urls(path, text, manifest):
+    """Point the url() references of the stylesheet ``path`` at hashed files."""
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        quote, url = match.groups()
+        target, suffix = re.match(r"([^?#]*)(.*)", url).groups()
+        if target.startswith("/static/"):
+            key = target[len("/static/") :]
+        elif "://" in target or target.startswith(("/", "data:")):
+            return match.group(0)
+        else:
+            key = posixpath.normpath(posixpath.join(base, target))
+        if key not in manifest:
+            return match.group(0)
+        hashed = posixpath.relpath(manifest[key], base or ".")
+        return f"url({quote}{hashed}{suffix}{quote})"
+
+    return CSS_URL.sub(replace, text)
+
+
+def write_file(dest, content):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with open(dest + ".tmp", "wb") as f:
+        f.write(content)
+    # workers may be serving the directory while it is built
+    os.replace(dest + ".tmp", dest)
+
+
+def write_asset(target, path, content):
+    dest = os.path.join(target, *path.split("/"))
+    if os.path.exists(dest):
+        # the name is the content hash, an earlier build wrote the same file
+        return
+    if path.endswith(COMPRESSIBLE):
+        packed = gzip.compress(content, 9, mtime=0)
+        if len(packed) < len(content):
+            write_file(dest + ".gz", packed)
+        if brotli is not None:
+            packed = brotli.compress(content, quality=11)
+            if len(packed) < len(content):
+                write_file(dest + ".br", packed)
+    # written last, so an existing file means its variants exist too
+    write_file(dest, content)
+
+
+def build(source, target):
+    """Build every file under ``source`` into ``target``, return the manifest."""
+    paths = list()
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.relpath(os.path.join(root, name), source)
+            paths.append(path.replace(os.sep, "/"))
+    # stylesheets last, so the files they reference are hashed already
+    paths.sort(key=lambda path: path.endswith(".css"))
+    manifest = dict()
+    for path in paths:
+        with open(os.path.join(source, path), "rb") as f:
+            content = minify(path, f.read())
+        if path.endswith(".css"):
+            text = rewrite_urls(path, content.decode("utf-8"), manifest)
+            content = text.encode("utf-8")
+        manifest[path] = fingerprint(path, content)
+        write_asset(target, manifest[path], content)
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+    write_file(os.path.join(target, MANIFEST), data)
+    return manifest
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = dict()
+        self.build_dir = None
+        self.url = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault(
+            "ASSETS_BUILD_DIR", os.path.join(app.root_path, "build", "assets")
+        )
+        app.config.setdefault("ASSETS_URL", None)
+        self.url = app.config["ASSETS_URL"]
+        self.load(app.config["ASSETS_BUILD_DIR"])
+        app.add_url_rule("/assets/<path:filename>", "assets", self.send)
+        app.add_template_global(self.asset_url, "asset_url")
+        app.extensions["assets"] = self
+
+    def load(self, build_dir):
+        self.build_dir = build_dir
+        try:
+            with open(os.path.join(build_dir, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = dict()
+
+    def asset_url(self, path):
+        hashed = self.manifest.get(path)
+        if hashed is None:
+            return url_for("static", filename=path)
+        if self.url:
+            return f"{self.url.rstrip('/')}/{hashed}"
+        return url_for("assets", filename=hashed)
+
+    def send(self, filename):
+        accepted = request.accept_encodings
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if accepted.quality(encoding) <= 0:
+                continue
+            try:
+                response = send_from_directory(
+                    self.build_dir, filename + suffix, mimetype=mimetype
+                )
+            except NotFound:
+                continue
+            response.headers["Content-Encoding"] = encoding
+            break
+        if response is None:
+            response = send_from_directory(self.build_dir, filename)
+        response.headers["Cache-Control"] = f"public, max-age={MAX_AGE}, immutable"
+        response.vary.add("Accept-Encoding")
+        return response
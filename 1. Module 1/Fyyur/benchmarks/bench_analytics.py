@@ -0,0 +1,77 @@
+"""Benchmark the show analytics endpoint against counting shows directly.
+
+Seeds the benchmark database, then requests three years of day, week and
+month buckets for the busiest venue, and times the same counts computed
+straight from the Show table, and the full request time of the endpoint.
+
+    python -m benchmarks.bench_analytics [--shows 200000] [--requests 50]
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from benchmarks import BENCH_DATABASE_URL, seed, setup_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=10000)
+    parser.add_argument("--artists", type=int, default=1000)
+    parser.add_argument("--shows", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--database", default=BENCH_DATABASE_URL)
+    parser.add_argument(
+        "--no-seed", action="store_true", help="reuse the already seeded database"
+    )
+    args = parser.parse_args()
+
+    fyyur = setup_app(args.database)
+    client = fyyur.app.test_client()
+    with fyyur.app.app_context():
+        if not args.no_seed:
+            seed(fyyur.db, venues=args.venues, artists=args.artists, shows=args.shows)
+        db, Show = fyyur.db, fyyur.Show
+        # seeded shows skew towards the low ids, venue 1 is the busiest
+        venue_id, shows = (
+            db.session.query(Show.venue_id, db.func.count(Show.id))
+            .group_by(Show.venue_id)
+            .order_by(db.func.count(Show.id).desc())
+            .first()
+        )
+        db.session.remove()
+
+    end = date.today() + timedelta(days=365)
+    start = end - timedelta(days=3 * 365)
+    print(f"venue {venue_id} ({shows} shows), {start} to {end}")
+    print(f"  {'bucket':<8} {'rollup ms':>10} {'direct ms':>10} {'endpoint ms':>12}")
+    for bucket in fyyur.analytics.BUCKETS:
+        timings = list()
+        for rollup in (True, False):
+            with fyyur.app.app_context():
+                begin = time.perf_counter()
+                for _ in range(args.requests):
+                    fyyur.analytics.bucket_counts(
+                        db,
+                        Show,
+                        fyyur.ShowRollup,
+                        "venue",
+                        venue_id,
+                        bucket,
+                        start,
+                        end,
+                        rollup,
+                    )
+                timings.append((time.perf_counter() - begin) / args.requests * 1000)
+                db.session.remove()
+        path = f"/venues/{venue_id}/analytics?bucket={bucket}&start={start}&end={end}"
+        begin = time.perf_counter()
+        for _ in range(args.requests):
+            client.get(path)
+        timings.append((time.perf_counter() - begin) / args.requests * 1000)
+        print(
+            f"  {bucket:<8} {timings[0]:>10.2f} {timings[1]:>10.2f} {timings[2]:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
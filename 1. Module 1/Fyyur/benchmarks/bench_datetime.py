@@ -0,0 +1,62 @@
+"""Micro-benchmark the Jinja ``datetime`` filter.
+
+Formats 100k show timestamps with the previous filter (string round trip
+through dateutil and a babel pattern lookup per call) and with
+``format_datetime``, which takes datetime objects and caches patterns and
+results. No database is needed.
+
+    python -m benchmarks.bench_datetime [--shows 100000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+
+def legacy_format_datetime(value, format="medium"):
+    date = dateutil.parser.parse(value)
+    if format == "full":
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == "medium":
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def show_timestamps(count, seed=0):
+    # shows start on the hour in the evening, so timestamps repeat a lot
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    return [
+        start + timedelta(days=rng.randint(0, 730), hours=rng.randint(18, 23))
+        for _ in range(count)
+    ]
+
+
+def timed(fn, values):
+    start = time.perf_counter()
+    for value in values:
+        fn(value)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shows", type=int, default=100000)
+    args = parser.parse_args()
+
+    from app import cached_format_datetime, format_datetime
+
+    values = show_timestamps(args.shows)
+    before = timed(lambda v: legacy_format_datetime(str(v), "full"), values)
+    after = timed(lambda v: format_datetime(v, "full"), values)
+
+    print(f"datetime filter over {args.shows} show timestamps")
+    print(f"  before: {before * 1000:10.1f} ms")
+    print(f"  after:  {after * 1000:10.1f} ms  {cached_format_datetime.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Load test every Fyyur route and record latency, queries and memory.
+
+Seeds the benchmark database (Postgres, or SQLite with a ``sqlite:///`` URL),
+then sends ``--requests`` requests to each route through the Flask test
+client, or through a local WSGI server with ``--server``. For every route it
+reports p50/p95/p99 latency, SQL statements per request (read from the
+``X-Query-Count`` header) and the peak Python memory of one request.
+
+Results are written as JSON to ``benchmarks/results/<commit>.json`` so runs
+can be compared across commits:
+
+    python -m benchmarks.bench_routes [--venues 10000] [--shows 200000]
+        [--requests 200] [--server] [--cold] [--no-seed]
+        [--database postgres://...] [--output results.json]
+        [--compare benchmarks/results/<other commit>.json]
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+from werkzeug.serving import make_server
+
+from benchmarks import BENCH_DATABASE_URL, seed, setup_app
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+# not benchmarked: file serving, and edits and deletes of the seeded rows
+SKIPPED = {
+    "static",
+    "assets",
+    "edit_venue_submission",
+    "edit_artist_submission",
+    "delete_venue",
+}
+
+
+class JsonBody(dict):
+    """A request body sent as JSON instead of as a form."""
+
+
+def routes():
+    """Return (name, method, path, data) for every benchmarked route.
+
+    ``data`` is None, a form or JsonBody, or a function of the request index
+    returning one, for requests that must differ to take the same path.
+    """
+    # after the seeded shows, which end a year from now
+    start = datetime.now().replace(minute=0, second=0, microsecond=0)
+    start += timedelta(days=800)
+    today = datetime.now().date()
+
+    def show(i):
+        start_time = start + timedelta(hours=4 * i)
+        return {
+            "artist_id": "1",
+            "venue_id": "1",
+            "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    def schedule(i):
+        # ten free slots per request, a year after the submitted shows
+        start_time = start + timedelta(days=365 + i)
+        return JsonBody(
+            bookings=[
+                {"artist_id": n, "venue_id": n, "start_time": start_time.isoformat(),}
+                for n in range(1, 11)
+            ]
+        )
+
+    def venue(i):
+        return {
+            "name": f"Bench Venue {i}",
+            "city": "Austin",
+            "state": "TX",
+            "address": f"{i} Bench Street",
+            "phone": "123-123-1234",
+            "genres": "Jazz",
+        }
+
+    def artist(i):
+        return {
+            "name": f"Bench Artist {i}",
+            "city": "Austin",
+            "state": "TX",
+            "phone": "123-123-1234",
+            "genres": "Jazz",
+        }
+
+    analytics = f"bucket=week&start={today}&end={today + timedelta(days=365)}"
+    return [
+        ("index", "GET", "/", None),
+        ("venues", "GET", "/venues", None),
+        ("venue", "GET", "/venues/1", None),
+        ("venue edit", "GET", "/venues/1/edit", None),
+        ("venue create", "GET", "/venues/create", None),
+        ("venue submit", "POST", "/venues/create", venue),
+        ("venue search", "POST", "/venues/search", {"search_term": "nue 12"}),
+        ("venue browse", "GET", "/venues/browse?genre=Jazz&state=CA", None),
+        ("venue autocomplete", "GET", "/venues/autocomplete?q=venue", None),
+        ("venue analytics", "GET", f"/venues/1/analytics?{analytics}", None),
+        ("artists", "GET", "/artists", None),
+        ("artist", "GET", "/artists/1", None),
+        ("artist edit", "GET", "/artists/1/edit", None),
+        ("artist create", "GET", "/artists/create", None),
+        ("artist submit", "POST", "/artists/create", artist),
+        ("artist search", "POST", "/artists/search", {"search_term": "ist 12"}),
+        ("artist browse", "GET", "/artists/browse?genre=Jazz", None),
+        ("artist autocomplete", "GET", "/artists/autocomplete?q=artist", None),
+        ("artist analytics", "GET", f"/artists/1/analytics?{analytics}", None),
+        ("shows", "GET", "/shows", None),
+        ("shows upcoming", "GET", "/shows?when=upcoming", None),
+        ("show create", "GET", "/shows/create", None),
+        ("show submit", "POST", "/shows/create", show),
+        ("show schedule", "POST", "/shows/schedule", schedule),
+        ("cache metrics", "GET", "/metrics/cache", None),
+        ("pool metrics", "GET", "/metrics/pool", None),
+        ("template metrics", "GET", "/metrics/templates", None),
+    ]
+
+
+def uncovered(app, routes):
+    """Return the endpoints of ``app`` neither benchmarked nor SKIPPED."""
+    adapter = app.url_map.bind("localhost")
+    covered = set()
+    for _, method, path, _ in routes:
+        endpoint, _ = adapter.match(urllib.parse.urlsplit(path).path, method)
+        covered.add(endpoint)
+    return sorted(
+        rule.endpoint
+        for rule in app.url_map.iter_rules()
+        if rule.endpoint not in covered | SKIPPED
+    )
+
+
+class TestClientDriver:
+    """Send requests in process through the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data):
+        if isinstance(data, JsonBody):
+            response = self.client.open(path, method=method, json=data)
+        else:
+            response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers.get("X-Query-Count")
+
+    def close(self):
+        pass
+
+
+class ServerDriver:
+    """Send HTTP requests to the app served by a local WSGI server."""
+
+    def __init__(self, app):
+        # keep the per request access log out of the report
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def request(self, method, path, data):
+        headers = dict()
+        if isinstance(data, JsonBody):
+            body = json.dumps(data).encode()
+            headers["Content-Type"] = "application/json"
+        else:
+            body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(
+            self.url + path, data=body, headers=headers, method=method
+        )
+        try:
+            with urllib.request.urlopen(req) as response:
+                response.read()
+                return response.status, response.headers.get("X-Query-Count")
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get("X-Query-Count")
+
+    def close(self):
+        self.server.shutdown()
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(int(round(p / 100 * len(samples))) - 1, 0)
+    return samples[min(index, len(samples) - 1)]
+
+
+def bench_route(driver, cache, method, path, data, requests, cold=False):
+    timings = list()
+    queries = list()
+    statuses = set()
+    body = data if callable(data) else lambda i: data
+    for i in range(requests):
+        if cold:
+            cache.clear()
+        start = time.perf_counter()
+        status, count = driver.request(method, path, body(i))
+        timings.append(time.perf_counter() - start)
+        statuses.add(status)
+        if count is not None:
+            queries.append(int(count))
+    # one extra request under tracemalloc, so tracing does not skew timings
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    driver.request(method, path, body(requests))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "method": method,
+        "path": path,
+        "requests": requests,
+        "status": sorted(statuses),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+        "queries": round(sum(queries) / len(queries), 2) if queries else None,
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def current_commit():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, previous):
+    print(f"\ncompared with {previous['commit']} ({previous['created']})")
+    print(f"  {'route':<20} {'p50 ms':>18} {'p95 ms':>18} {'queries':>14}")
+    for name, now in results["routes"].items():
+        then = previous["routes"].get(name)
+        if then is None:
+            continue
+        print(
+            f"  {name:<20} "
+            f"{then['p50_ms']:>8.2f} → {now['p50_ms']:<7.2f} "
+            f"{then['p95_ms']:>8.2f} → {now['p95_ms']:<7.2f} "
+            f"{str(then['queries']):>5} → {str(now['queries']):<5}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=10000)
+    parser.add_argument("--artists", type=int, default=1000)
+    parser.add_argument("--shows", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=200, help="per route")
+    parser.add_argument("--database", default=BENCH_DATABASE_URL)
+    parser.add_argument(
+        "--server", action="store_true", help="go through a local WSGI server"
+    )
+    parser.add_argument(
+        "--cold", action="store_true", help="clear the page cache before requests"
+    )
+    parser.add_argument(
+        "--no-seed", action="store_true", help="reuse the already seeded database"
+    )
+    parser.add_argument("--output", help="defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="a previous results file")
+    args = parser.parse_args()
+
+    fyyur = setup_app(args.database)
+    with fyyur.app.app_context():
+        if not args.no_seed:
+            seed(fyyur.db, venues=args.venues, artists=args.artists, shows=args.shows)
+        dialect = fyyur.db.engine.dialect.name
+        volumes = {
+            "venues": fyyur.Venue.query.count(),
+            "artists": fyyur.Artist.query.count(),
+            "shows": fyyur.Show.query.count(),
+        }
+        fyyur.db.session.remove()
+    fyyur.cache.clear()
+
+    missing = uncovered(fyyur.app, routes())
+    if missing:
+        print(f"not benchmarked: {', '.join(missing)}")
+
+    driver = (ServerDriver if args.server else TestClientDriver)(fyyur.app)
+    results = {
+        "commit": current_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "database": dialect,
+        "driver": "server" if args.server else "test client",
+        "cache": "cold" if args.cold else "warm",
+        "volumes": volumes,
+        "routes": dict(),
+    }
+    print(
+        f"{'route':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} "
+        f"{'peak KiB':>9}"
+    )
+    try:
+        for name, method, path, data in routes():
+            result = bench_route(
+                driver, fyyur.cache, method, path, data, args.requests, args.cold
+            )
+            results["routes"][name] = result
+            print(
+                f"{name:<20} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                f"{result['p99_ms']:>9.2f} {str(result['queries']):>8} "
+                f"{result['peak_memory_kb']:>9.1f}"
+            )
+    finally:
+        driver.close()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
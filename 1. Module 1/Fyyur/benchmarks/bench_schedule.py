@@ -0,0 +1,72 @@
+"""Benchmark the /shows/schedule batch booking endpoint.
+
+Seeds the benchmark database, then posts one batch of random bookings (some
+of them clashing with existing shows or with each other) and reports how long
+the request took and how many bookings were accepted. The conflict check of
+``scheduling.schedule()`` is timed on its own first, in a transaction that
+is rolled back, since the rest of the request is inserting the shows.
+
+    python -m benchmarks.bench_schedule [--bookings 10000] [--shows 200000]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import scheduling
+from benchmarks import seed, setup_app
+
+
+def bookings(count, venues, artists, rng):
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    return [
+        {
+            "artist_id": rng.randint(1, artists),
+            "venue_id": rng.randint(1, venues),
+            "start_time": (
+                now + timedelta(hours=rng.randint(24, 24 * 365))
+            ).isoformat(),
+            "duration": rng.choice([60, 90, 120, 180]),
+        }
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=10000)
+    parser.add_argument("--venues", type=int, default=10000)
+    parser.add_argument("--artists", type=int, default=1000)
+    parser.add_argument("--shows", type=int, default=200000)
+    args = parser.parse_args()
+
+    fyyur = setup_app()
+    client = fyyur.app.test_client()
+    with fyyur.app.app_context():
+        seed(fyyur.db, venues=args.venues, artists=args.artists, shows=args.shows)
+        fyyur.db.session.remove()
+    batch = bookings(args.bookings, args.venues, args.artists, random.Random(0))
+
+    with fyyur.app.app_context():
+        start = time.perf_counter()
+        scheduling.schedule(fyyur.db, fyyur.Show, fyyur.Venue, fyyur.Artist, batch)
+        checked = time.perf_counter() - start
+        fyyur.db.session.rollback()
+        fyyur.db.session.remove()
+
+    start = time.perf_counter()
+    response = client.post("/shows/schedule", json={"bookings": batch})
+    elapsed = time.perf_counter() - start
+    result = json.loads(response.data)
+
+    print(f"{args.bookings} bookings against {args.shows} shows")
+    print(f"  {checked * 1000:.1f} ms to check for conflicts")
+    print(
+        f"  {elapsed * 1000:.1f} ms, {result['scheduled']} scheduled, "
+        f"{len(result['conflicts'])} conflicts"
+    )
+
+
+if __name__ == "__main__":
+    main()
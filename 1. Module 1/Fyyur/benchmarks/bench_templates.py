@@ -0,0 +1,109 @@
+"""Benchmark template loading at cold start and page rendering.
+
+Cold start loads every template into a fresh environment, as a new worker
+does: once compiling from source, once from a warm bytecode cache. Steady
+state requests every GET route ``--requests`` times with the page cache
+cleared, with template auto-reload on (the development setting) and off,
+and reports the request time per route and the render time per template.
+
+    python -m benchmarks.bench_templates [--requests 100] [--rounds 5]
+        [--venues 1000] [--shows 20000] [--no-seed] [--database postgres://...]
+"""
+import argparse
+import tempfile
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+from benchmarks import BENCH_DATABASE_URL, seed, setup_app
+from benchmarks.bench_routes import routes
+from templating import precompile
+
+
+def cold_start(env, rounds):
+    """Return (templates, ms from source, ms from bytecode), best of ``rounds``."""
+    timings = {"source": list(), "bytecode": list()}
+    with tempfile.TemporaryDirectory() as tmp:
+        # fill the bytecode cache once, like the previous deploy would have
+        count = precompile(
+            env.overlay(cache_size=400, bytecode_cache=FileSystemBytecodeCache(tmp))
+        )
+        for _ in range(rounds):
+            for mode, bytecode_cache in (
+                ("source", None),
+                ("bytecode", FileSystemBytecodeCache(tmp)),
+            ):
+                fresh = env.overlay(cache_size=400, bytecode_cache=bytecode_cache)
+                start = time.perf_counter()
+                precompile(fresh)
+                timings[mode].append(time.perf_counter() - start)
+    return count, min(timings["source"]) * 1000, min(timings["bytecode"]) * 1000
+
+
+def steady_state(fyyur, paths, requests):
+    """Return mean request ms per path and the per template render stats."""
+    client = fyyur.app.test_client()
+    fyyur.templates.reset()
+    results = dict()
+    for path in paths:
+        # warm up, templates are compiled on first use
+        client.get(path)
+        fyyur.cache.clear()
+        total = 0.0
+        for _ in range(requests):
+            start = time.perf_counter()
+            client.get(path)
+            total += time.perf_counter() - start
+            fyyur.cache.clear()
+        results[path] = total / requests * 1000
+    return results, fyyur.templates.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100, help="per route")
+    parser.add_argument("--rounds", type=int, default=5, help="cold start rounds")
+    parser.add_argument("--venues", type=int, default=1000)
+    parser.add_argument("--artists", type=int, default=200)
+    parser.add_argument("--shows", type=int, default=20000)
+    parser.add_argument("--database", default=BENCH_DATABASE_URL)
+    parser.add_argument(
+        "--no-seed", action="store_true", help="reuse the already seeded database"
+    )
+    args = parser.parse_args()
+
+    fyyur = setup_app(args.database)
+    if not args.no_seed:
+        with fyyur.app.app_context():
+            seed(fyyur.db, venues=args.venues, artists=args.artists, shows=args.shows)
+            fyyur.db.session.remove()
+
+    count, source_ms, bytecode_ms = cold_start(fyyur.app.jinja_env, args.rounds)
+    print(f"cold start, {count} templates (best of {args.rounds})")
+    print(f"  compiled from source   {source_ms:>8.2f} ms")
+    print(f"  loaded from bytecode   {bytecode_ms:>8.2f} ms")
+
+    paths = [path for _, method, path, _ in routes() if method == "GET"]
+    env = fyyur.app.jinja_env
+    reload_on, renders_on = None, None
+    for auto_reload in (True, False):
+        env.auto_reload = auto_reload
+        env.cache.clear()
+        timings, renders = steady_state(fyyur, paths, args.requests)
+        if auto_reload:
+            reload_on, renders_on = timings, renders
+        else:
+            reload_off, renders_off = timings, renders
+
+    print(f"\nsteady state, mean ms over {args.requests} requests (reload on → off)")
+    print(f"  {'route':<40} {'request ms':>20}")
+    for path in paths:
+        print(f"  {path:<40} {reload_on[path]:>9.2f} → {reload_off[path]:<8.2f}")
+    print(f"  {'template':<40} {'render ms':>20}")
+    for name, stats in renders_off.items():
+        before = renders_on.get(name, stats)["mean_ms"]
+        print(f"  {name:<40} {before:>9.2f} → {stats['mean_ms']:<8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark the /venues directory page.
+
+Compares the previous implementation (one Show query per venue plus a scan of
+every area per venue) with the grouped aggregate query used by ``venues()``.
+The page cache is invalidated before each request so the query is timed;
+the time of a cached response is reported on its own line.
+
+    python -m benchmarks.bench_venues [--venues 10000] [--shows 200000]
+"""
+import argparse
+from datetime import datetime
+
+from flask import render_template
+
+from benchmarks import measure, seed, setup_app
+
+
+def legacy_venues(Venue, Show):
+    data = list()
+    venues = Venue.query.all()
+    venue_locations = set()
+    for v in venues:
+        venue_locations.add((v.city, v.state))
+    for loc in venue_locations:
+        data.append({"city": loc[0], "state": loc[1], "venues": []})
+    for v in venues:
+        num_upcoming_shows = 0
+        shows = Show.query.filter_by(venue_id=v.id).all()
+        for s in shows:
+            if s.start_time > datetime.now():
+                num_upcoming_shows += 1
+        for d in data:
+            if v.city == d["city"] and v.state == d["state"]:
+                d["venues"].append(
+                    {
+                        "id": v.id,
+                        "name": v.name,
+                        "num_upcoming_shows": num_upcoming_shows,
+                    }
+                )
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=10000)
+    parser.add_argument("--shows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fyyur = setup_app()
+    client = fyyur.app.test_client()
+    with fyyur.app.app_context():
+        seed(fyyur.db, venues=args.venues, shows=args.shows)
+
+        def before_page():
+            with fyyur.app.test_request_context("/venues"):
+                areas = legacy_venues(fyyur.Venue, fyyur.Show)
+                render_template("pages/venues.html", areas=areas)
+
+        before = measure(before_page, args.repeat)
+        fyyur.db.session.remove()
+
+        def after_page():
+            # time the grouped query, not a page cache hit
+            fyyur.cache.invalidate("venues")
+            client.get("/venues")
+
+        after = measure(after_page, args.repeat)
+        cached = measure(lambda: client.get("/venues"), args.repeat)
+
+    print(f"/venues with {args.venues} venues and {args.shows} shows")
+    print(f"  before: {before[0] * 1000:10.1f} ms {before[1]:8d} queries")
+    print(f"  after:  {after[0] * 1000:10.1f} ms {after[1]:8d} queries")
+    print(f"  cached: {cached[0] * 1000:10.1f} ms {cached[1]:8d} queries")
+
+
+if __name__ == "__main__":
+    main()
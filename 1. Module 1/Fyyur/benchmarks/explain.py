@@ -0,0 +1,92 @@
+"""Check that the hot Fyyur queries are served by their indexes.
+
+Runs ``EXPLAIN (FORMAT JSON)`` for the queries behind the detail, listing,
+search and genre pages and fails if a plan does not use the expected index.
+Run it against a seeded Postgres database (``python -m benchmarks.seed_data``)
+so the planner sees realistic volumes.
+
+    python -m benchmarks.explain [--database postgres://...]
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from benchmarks import BENCH_DATABASE_URL, setup_app
+
+
+def hot_queries(fyyur):
+    """Yield (name, expected index, query) for every hot query."""
+    db, Venue, Artist, Show = fyyur.db, fyyur.Venue, fyyur.Artist, fyyur.Show
+    now = datetime.now()
+    yield "venue shows", "ix_Show_venue_id_start_time", (
+        db.session.query(Show.start_time, Artist.name)
+        .join(Artist, Show.artist_id == Artist.id)
+        .filter(Show.venue_id == 1)
+        .order_by(Show.start_time)
+    )
+    yield "artist shows", "ix_Show_artist_id_start_time", (
+        db.session.query(Show.start_time, Venue.name)
+        .join(Venue, Show.venue_id == Venue.id)
+        .filter(Show.artist_id == 1)
+        .order_by(Show.start_time)
+    )
+    yield "venue upcoming shows", "ix_Show_venue_id_start_time", (
+        db.session.query(Show.id).filter(Show.venue_id == 1, Show.start_time > now)
+    )
+    yield "shows page", "ix_Show_start_time_id", (
+        db.session.query(Show.id, Show.start_time)
+        .order_by(Show.start_time, Show.id)
+        .limit(fyyur.SHOWS_PER_PAGE + 1)
+    )
+    yield "venue search", "ix_Venue_name_trgm", (
+        db.session.query(Venue.id).filter(Venue.name.ilike("%nue 123%"))
+    )
+    yield "artist search", "ix_Artist_name_trgm", (
+        db.session.query(Artist.id).filter(Artist.name.ilike("%ist 12%"))
+    )
+    yield "venue genres", "ix_Venue_genres", (
+        db.session.query(Venue.id).filter(Venue.genres.contains(["Jazz", "Soul"]))
+    )
+    yield "artist genres", "ix_Artist_genres", (
+        db.session.query(Artist.id).filter(Artist.genres.contains(["Jazz", "Soul"]))
+    )
+
+
+def plan_indexes(node):
+    """Return the names of every index used anywhere in a plan node."""
+    indexes = set()
+    if "Index Name" in node:
+        indexes.add(node["Index Name"])
+    for child in node.get("Plans", []):
+        indexes |= plan_indexes(child)
+    return indexes
+
+
+def explain(db, query):
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    plan = db.engine.execute(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    return plan[0]["Plan"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=BENCH_DATABASE_URL)
+    args = parser.parse_args()
+
+    fyyur = setup_app(args.database)
+    failed = 0
+    with fyyur.app.app_context():
+        if fyyur.db.engine.dialect.name != "postgresql":
+            sys.exit("EXPLAIN checks need a Postgres database")
+        for name, index, query in hot_queries(fyyur):
+            used = plan_indexes(explain(fyyur.db, query))
+            ok = index in used
+            failed += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name:<22} {index:<30} {sorted(used)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Seed a database with generated venues, artists and shows for load testing.
+
+The schema is dropped and recreated first, so never point this at real data.
+
+    python -m benchmarks.seed_data [--venues 10000] [--artists 1000]
+        [--shows 200000] [--database postgres://...]
+"""
+import argparse
+import time
+
+from benchmarks import BENCH_DATABASE_URL, seed, setup_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=10000)
+    parser.add_argument("--artists", type=int, default=1000)
+    parser.add_argument("--shows", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--skew", type=float, default=2, help="show concentration")
+    parser.add_argument("--database", default=BENCH_DATABASE_URL)
+    args = parser.parse_args()
+
+    fyyur = setup_app(args.database)
+    start = time.perf_counter()
+    with fyyur.app.app_context():
+        seed(
+            fyyur.db,
+            venues=args.venues,
+            artists=args.artists,
+            shows=args.shows,
+            seed=args.seed,
+            skew=args.skew,
+        )
+    print(
+        f"seeded {args.venues} venues, {args.artists} artists and {args.shows} "
+        f"shows in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
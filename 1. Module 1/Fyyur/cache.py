@@ -0,0 +1,172 @@
+"""Full-page response cache for the read-heavy Fyyur pages.
+
+Pages are cached under their path plus the current version of every tag
+they depend on (e.g. ``venue:3`` or ``artists``). Write handlers bump the
+versions of the tags they touch, so stale pages are never served again and
+simply age out of the backend.
+
+The backend is an in-process LRU by default, or Redis when
+``CACHE_REDIS_URL`` is configured and the redis package is installed.
+Entries live for ``CACHE_DEFAULT_TTL`` seconds at most; a view can shorten
+that with ``expire_at()``, e.g. to the start of the next upcoming show.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from threading import Lock
+
+from flask import Response, g, make_response, request, session
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional
+    redis = None
+
+
+class LRUBackend:
+    """Process local backend, evicting the least recently used entries."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.versions = dict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_versions(self, tags):
+        with self.lock:
+            return [self.versions.get(tag, 0) for tag in tags]
+
+    def incr(self, tag):
+        with self.lock:
+            self.versions[tag] = self.versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.versions.clear()
+
+
+class RedisBackend:
+    """Backend shared by every worker, built on a redis client."""
+
+    def __init__(self, client, prefix="fyyur:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, px=max(int(ttl * 1000), 1))
+
+    def get_versions(self, tags):
+        versions = self.client.mget([f"{self.prefix}tag:{tag}" for tag in tags])
+        return [int(v or 0) for v in versions]
+
+    def incr(self, tag):
+        self.client.incr(f"{self.prefix}tag:{tag}")
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class ResponseCache:
+    def __init__(self, app=None, backend=None):
+        self.backend = backend
+        self.default_ttl = 300
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.default_ttl = app.config.get("CACHE_DEFAULT_TTL", self.default_ttl)
+        if self.backend is None:
+            url = app.config.get("CACHE_REDIS_URL")
+            if url and redis is not None:
+                self.backend = RedisBackend(redis.Redis.from_url(url))
+            else:
+                self.backend = LRUBackend(app.config.get("CACHE_MAXSIZE", 1024))
+
+    def page(self, tags):
+        """Cache a GET view; ``tags`` maps the view kwargs to its tag list."""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                # pages carrying flashed messages are personal, never cache them
+                if request.method != "GET" or session.get("_flashes"):
+                    return view(**kwargs)
+                page_tags = tags(**kwargs)
+                versions = self.backend.get_versions(page_tags)
+                key = "page:{}:{}".format(
+                    request.full_path, ",".join(map(str, versions))
+                )
+                body = self.backend.get(key)
+                if body is not None:
+                    self.hits += 1
+                    response = Response(body, mimetype="text/html")
+                    response.headers["X-Cache"] = "HIT"
+                    return response
+                self.misses += 1
+                g.cache_expires = None
+                response = make_response(view(**kwargs))
+                if response.status_code == 200:
+                    self.backend.set(key, response.get_data(), self.ttl())
+                response.headers["X-Cache"] = "MISS"
+                return response
+
+            return wrapper
+
+        return decorator
+
+    def expire_at(self, when):
+        """Expire the page being rendered no later than ``when``."""
+        if g.get("cache_expires") is None or when < g.cache_expires:
+            g.cache_expires = when
+
+    def ttl(self):
+        ttl = self.default_ttl
+        if g.get("cache_expires") is not None:
+            ttl = min(ttl, (g.cache_expires - datetime.now()).total_seconds())
+        return max(ttl, 0.001)
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.incr(tag)
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
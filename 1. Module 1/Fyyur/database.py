@@ -0,0 +1,102 @@
+"""Engine configuration and read replica routing for Flask-SQLAlchemy.
+
+``RoutingSQLAlchemy`` builds every engine from ``SQLALCHEMY_ENGINE_OPTIONS``
+(pool size, overflow, pre-ping, recycle) plus ``DATABASE_STATEMENT_TIMEOUT``,
+and drops the pool sizing options SQLite's pools do not accept, so the same
+profile also runs the tests against SQLite.
+
+When a ``replica`` bind is configured in ``SQLALCHEMY_BINDS``, the session
+sends the reads of GET and HEAD requests to it. Anything else goes to the
+primary: other methods, flushes, Core inserts/updates/deletes, every
+statement after the first write of the session, and views decorated with
+``@primary`` (GET handlers that write, or must read their own writes).
+"""
+from functools import wraps
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm
+from sqlalchemy.sql.expression import UpdateBase
+
+REPLICA = "replica"
+READ_METHODS = ("GET", "HEAD")
+# SQLite uses a SingletonThreadPool, StaticPool or NullPool, none of them sized
+POOL_SIZING = ("pool_size", "max_overflow", "pool_timeout")
+
+
+def primary(view):
+    """Run every statement of ``view`` on the primary, even for GET requests."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_primary = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.pop("use_primary", None)
+
+    return wrapper
+
+
+def use_replica(app):
+    if REPLICA not in (app.config.get("SQLALCHEMY_BINDS") or ()):
+        return False
+    return (
+        has_request_context()
+        and request.method in READ_METHODS
+        and not g.get("use_primary")
+    )
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self.db = db
+        self.wrote = False
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.wrote = True
+        elif not self.wrote and use_replica(self.app):
+            return self.db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+    def close(self):
+        self.wrote = False
+        super().close()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        options = dict(engine_opts)
+        if sa_url.drivername.startswith("sqlite"):
+            for name in POOL_SIZING:
+                options.pop(name, None)
+        elif sa_url.drivername.startswith("postgres"):
+            timeout = self.get_app().config.get("DATABASE_STATEMENT_TIMEOUT")
+            if timeout:
+                connect_args = dict(options.get("connect_args", {}))
+                connect_args["options"] = f"-c statement_timeout={int(timeout)}"
+                options["connect_args"] = connect_args
+        return super().create_engine(sa_url, options)
+
+    def pool_stats(self, app=None):
+        """Connection pool counters of the primary and replica engines."""
+        app = self.get_app(app)
+        engines = {"primary": self.get_engine(app)}
+        if REPLICA in (app.config.get("SQLALCHEMY_BINDS") or ()):
+            engines[REPLICA] = self.get_engine(app, bind=REPLICA)
+        stats = dict()
+        for name, engine in engines.items():
+            pool = engine.pool
+            stats[name] = {"pool": type(pool).__name__}
+            # only QueuePool keeps these counters
+            for counter in ("size", "checkedin", "checkedout", "overflow"):
+                if hasattr(pool, counter):
+                    stats[name][counter] = getattr(pool, counter)()
+            if hasattr(pool, "timeout"):
+                stats[name]["timeout"] = pool.timeout()
+        return stats
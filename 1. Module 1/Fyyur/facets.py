@@ -0,0 +1,132 @@
+"""Genre, state and city faceting for venues and artists.
+
+Filters use array containment (``genres @> ARRAY[...]``), served by the GIN
+indexes on the genres columns. SQLite (used for local tests) stores genres
+as JSON and falls back to ``json_each`` and LIKE.
+
+Facet counts are computed over the filtered rows and kept for ``TTL``
+seconds at most in the page cache's backend (see cache.py), under a key
+holding the version of the model's ``facets:<table>`` tag. A transaction
+creating, editing or deleting a venue or artist bumps that version when it
+commits. With the Redis backend every worker then stops serving the old
+counts; the LRU backend bounds how many selections a worker keeps.
+"""
+import hashlib
+import json
+
+from sqlalchemy import String, cast, event, func, literal_column
+from sqlalchemy.orm import object_session
+
+TTL = 300
+
+_listening = False
+
+
+def tag(model):
+    return f"facets:{model.__tablename__}"
+
+
+def register(db, cache, model):
+    """Invalidate the facet counts of ``model`` once a write to it commits."""
+    global _listening
+
+    def changed(mapper, connection, target):
+        object_session(target).info.setdefault("facet_tags", set()).add(tag(model))
+
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, name, changed)
+    if not _listening:
+
+        @event.listens_for(db.session, "after_commit")
+        def invalidate_tags(session):
+            tags = session.info.pop("facet_tags", None)
+            if tags:
+                cache.invalidate(*tags)
+
+        @event.listens_for(db.session, "after_soft_rollback")
+        def discard_tags(session, previous_transaction):
+            session.info.pop("facet_tags", None)
+
+        _listening = True
+
+
+def invalidate(cache, model):
+    cache.invalidate(tag(model))
+
+
+def dialect_name(db, model):
+    return db.session.get_bind(mapper=model.__mapper__).dialect.name
+
+
+def filters(db, model, genres=(), state=None, city=None):
+    """Build the filter clauses for the given facet selection."""
+    clauses = list()
+    # soft deleted rows are left out of listings and counts alike
+    if hasattr(model, "deleted_at"):
+        clauses.append(model.deleted_at.is_(None))
+    if genres:
+        if dialect_name(db, model) == "postgresql":
+            clauses.append(model.genres.contains(list(genres)))
+        else:
+            clauses.extend(
+                cast(model.genres, String).like(f"%{json.dumps(genre)}%")
+                for genre in genres
+            )
+    if state:
+        clauses.append(model.state == state)
+    if city:
+        clauses.append(model.city == city)
+    return clauses
+
+
+def count_facets(db, cache, model, genres=(), state=None, city=None):
+    """Return {"genres": {...}, "state": {...}, "city": {...}} counts.
+
+    Counts are cached per (model, selection) until ``invalidate(cache,
+    model)`` or for ``TTL`` seconds.
+    """
+    (version,) = cache.backend.get_versions([tag(model)])
+    # the selection comes from the query string, hash it to bound the key
+    selection = json.dumps([model.__tablename__, sorted(genres), state, city])
+    key = "facets:{}:{}".format(version, hashlib.sha1(selection.encode()).hexdigest())
+    cached = cache.backend.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    where = filters(db, model, genres, state, city)
+    if dialect_name(db, model) == "postgresql":
+        genre = (
+            db.session.query(func.unnest(model.genres).label("genre"))
+            .filter(*where)
+            .subquery()
+        ).c.genre
+        genre_counts = db.session.query(genre, func.count()).group_by(genre)
+    else:
+        genre = literal_column("genre.value")
+        genre_counts = (
+            db.session.query(genre, func.count())
+            .select_from(model)
+            .join(func.json_each(model.genres).alias("genre"), literal_column("1"))
+            .filter(*where)
+            .group_by(genre)
+        )
+    facets = {
+        "genres": dict(genre_counts.all()),
+        "state": dict(
+            db.session.query(model.state, func.count())
+            .filter(*where)
+            .group_by(model.state)
+            .all()
+        ),
+        "city": {
+            f"{city}, {state}": count
+            for city, state, count in db.session.query(
+                model.city, model.state, func.count()
+            )
+            .filter(*where)
+            .group_by(model.city, model.state)
+            .all()
+        },
+    }
+    cache.backend.set(key, json.dumps(facets), TTL)
+    return facets
@@ -1,209 +1,144 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import (
+    StringField,
+    SelectField,
+    SelectMultipleField,
+    DateTimeField,
+    IntegerField,
+    HiddenField,
+)
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange, Optional
+
+
+# shared by the venue and artist forms, as tuples so they cannot be mutated
+STATE_CHOICES = (
+    ("AL", "AL"),
+    ("AK", "AK"),
+    ("AZ", "AZ"),
+    ("AR", "AR"),
+    ("CA", "CA"),
+    ("CO", "CO"),
+    ("CT", "CT"),
+    ("DE", "DE"),
+    ("DC", "DC"),
+    ("FL", "FL"),
+    ("GA", "GA"),
+    ("HI", "HI"),
+    ("ID", "ID"),
+    ("IL", "IL"),
+    ("IN", "IN"),
+    ("IA", "IA"),
+    ("KS", "KS"),
+    ("KY", "KY"),
+    ("LA", "LA"),
+    ("ME", "ME"),
+    ("MT", "MT"),
+    ("NE", "NE"),
+    ("NV", "NV"),
+    ("NH", "NH"),
+    ("NJ", "NJ"),
+    ("NM", "NM"),
+    ("NY", "NY"),
+    ("NC", "NC"),
+    ("ND", "ND"),
+    ("OH", "OH"),
+    ("OK", "OK"),
+    ("OR", "OR"),
+    ("MD", "MD"),
+    ("MA", "MA"),
+    ("MI", "MI"),
+    ("MN", "MN"),
+    ("MS", "MS"),
+    ("MO", "MO"),
+    ("PA", "PA"),
+    ("RI", "RI"),
+    ("SC", "SC"),
+    ("SD", "SD"),
+    ("TN", "TN"),
+    ("TX", "TX"),
+    ("UT", "UT"),
+    ("VT", "VT"),
+    ("VA", "VA"),
+    ("WA", "WA"),
+    ("WV", "WV"),
+    ("WI", "WI"),
+    ("WY", "WY"),
+)
+
+GENRE_CHOICES = (
+    ("Alternative", "Alternative"),
+    ("Blues", "Blues"),
+    ("Classical", "Classical"),
+    ("Country", "Country"),
+    ("Electronic", "Electronic"),
+    ("Folk", "Folk"),
+    ("Funk", "Funk"),
+    ("Hip-Hop", "Hip-Hop"),
+    ("Heavy Metal", "Heavy Metal"),
+    ("Instrumental", "Instrumental"),
+    ("Jazz", "Jazz"),
+    ("Musical Theatre", "Musical Theatre"),
+    ("Pop", "Pop"),
+    ("Punk", "Punk"),
+    ("R&B", "R&B"),
+    ("Reggae", "Reggae"),
+    ("Rock n Roll", "Rock n Roll"),
+    ("Soul", "Soul"),
+    ("Swing", "Swing"),
+    ("Other", "Other"),
+)
+
+YES_NO_CHOICES = (("Yes", "Yes"), ("No", "No"))
 
 
 class ShowForm(Form):
+    # ids are picked through the /artists and /venues autocomplete endpoints
     artist_id = StringField("artist_id")
     venue_id = StringField("venue_id")
+    # a callable default is evaluated for every new form, not at import time
     start_time = DateTimeField(
-        "start_time", validators=[DataRequired()], default=datetime.today()
+        "start_time", validators=[DataRequired()], default=datetime.today
+    )
+    duration = IntegerField(
+        "duration", validators=[Optional(), NumberRange(1, 24 * 60)], default=120
     )
 
 
 class VenueForm(Form):
     name = StringField("name", validators=[DataRequired()])
     city = StringField("city", validators=[DataRequired()])
-    state = SelectField(
-        "state",
-        validators=[DataRequired()],
-        choices=[
-            ("AL", "AL"),
-            ("AK", "AK"),
-            ("AZ", "AZ"),
-            ("AR", "AR"),
-            ("CA", "CA"),
-            ("CO", "CO"),
-            ("CT", "CT"),
-            ("DE", "DE"),
-            ("DC", "DC"),
-            ("FL", "FL"),
-            ("GA", "GA"),
-            ("HI", "HI"),
-            ("ID", "ID"),
-            ("IL", "IL"),
-            ("IN", "IN"),
-            ("IA", "IA"),
-            ("KS", "KS"),
-            ("KY", "KY"),
-            ("LA", "LA"),
-            ("ME", "ME"),
-            ("MT", "MT"),
-            ("NE", "NE"),
-            ("NV", "NV"),
-            ("NH", "NH"),
-            ("NJ", "NJ"),
-            ("NM", "NM"),
-            ("NY", "NY"),
-            ("NC", "NC"),
-            ("ND", "ND"),
-            ("OH", "OH"),
-            ("OK", "OK"),
-            ("OR", "OR"),
-            ("MD", "MD"),
-            ("MA", "MA"),
-            ("MI", "MI"),
-            ("MN", "MN"),
-            ("MS", "MS"),
-            ("MO", "MO"),
-            ("PA", "PA"),
-            ("RI", "RI"),
-            ("SC", "SC"),
-            ("SD", "SD"),
-            ("TN", "TN"),
-            ("TX", "TX"),
-            ("UT", "UT"),
-            ("VT", "VT"),
-            ("VA", "VA"),
-            ("WA", "WA"),
-            ("WV", "WV"),
-            ("WI", "WI"),
-            ("WY", "WY"),
-        ],
-    )
+    state = SelectField("state", validators=[DataRequired()], choices=STATE_CHOICES)
     address = StringField("address", validators=[DataRequired()])
     phone = StringField("phone", validators=[DataRequired()])
     image_link = StringField("image_link")
     genres = SelectMultipleField(
-        "genres",
-        validators=[DataRequired()],
-        choices=[
-            ("Alternative", "Alternative"),
-            ("Blues", "Blues"),
-            ("Classical", "Classical"),
-            ("Country", "Country"),
-            ("Electronic", "Electronic"),
-            ("Folk", "Folk"),
-            ("Funk", "Funk"),
-            ("Hip-Hop", "Hip-Hop"),
-            ("Heavy Metal", "Heavy Metal"),
-            ("Instrumental", "Instrumental"),
-            ("Jazz", "Jazz"),
-            ("Musical Theatre", "Musical Theatre"),
-            ("Pop", "Pop"),
-            ("Punk", "Punk"),
-            ("R&B", "R&B"),
-            ("Reggae", "Reggae"),
-            ("Rock n Roll", "Rock n Roll"),
-            ("Soul", "Soul"),
-            ("Swing", "Swing"),
-            ("Other", "Other"),
-        ],
+        "genres", validators=[DataRequired()], choices=GENRE_CHOICES
     )
     facebook_link = StringField("facebook_link", validators=[URL()])
     website = StringField("website", validators=[URL()])
     seeking_talent = SelectField(
-        "seeking_talent",
-        validators=[DataRequired()],
-        choices=[("Yes", "Yes"), ("No", "No")],
+        "seeking_talent", validators=[DataRequired()], choices=YES_NO_CHOICES
     )
     seeking_description = StringField("seeking_description")
+    # the version the edit form was loaded at, see save_edit()
+    version = HiddenField("version")
 
 
 class ArtistForm(Form):
     name = StringField("name", validators=[DataRequired()])
     city = StringField("city", validators=[DataRequired()])
-    state = SelectField(
-        "state",
-        validators=[DataRequired()],
-        choices=[
-            ("AL", "AL"),
-            ("AK", "AK"),
-            ("AZ", "AZ"),
-            ("AR", "AR"),
-            ("CA", "CA"),
-            ("CO", "CO"),
-            ("CT", "CT"),
-            ("DE", "DE"),
-            ("DC", "DC"),
-            ("FL", "FL"),
-            ("GA", "GA"),
-            ("HI", "HI"),
-            ("ID", "ID"),
-            ("IL", "IL"),
-            ("IN", "IN"),
-            ("IA", "IA"),
-            ("KS", "KS"),
-            ("KY", "KY"),
-            ("LA", "LA"),
-            ("ME", "ME"),
-            ("MT", "MT"),
-            ("NE", "NE"),
-            ("NV", "NV"),
-            ("NH", "NH"),
-            ("NJ", "NJ"),
-            ("NM", "NM"),
-            ("NY", "NY"),
-            ("NC", "NC"),
-            ("ND", "ND"),
-            ("OH", "OH"),
-            ("OK", "OK"),
-            ("OR", "OR"),
-            ("MD", "MD"),
-            ("MA", "MA"),
-            ("MI", "MI"),
-            ("MN", "MN"),
-            ("MS", "MS"),
-            ("MO", "MO"),
-            ("PA", "PA"),
-            ("RI", "RI"),
-            ("SC", "SC"),
-            ("SD", "SD"),
-            ("TN", "TN"),
-            ("TX", "TX"),
-            ("UT", "UT"),
-            ("VT", "VT"),
-            ("VA", "VA"),
-            ("WA", "WA"),
-            ("WV", "WV"),
-            ("WI", "WI"),
-            ("WY", "WY"),
-        ],
-    )
+    state = SelectField("state", validators=[DataRequired()], choices=STATE_CHOICES)
     phone = StringField("phone", validators=[DataRequired()])
     image_link = StringField("image_link")
     genres = SelectMultipleField(
-        "genres",
-        validators=[DataRequired()],
-        choices=[
-            ("Alternative", "Alternative"),
-            ("Blues", "Blues"),
-            ("Classical", "Classical"),
-            ("Country", "Country"),
-            ("Electronic", "Electronic"),
-            ("Folk", "Folk"),
-            ("Funk", "Funk"),
-            ("Hip-Hop", "Hip-Hop"),
-            ("Heavy Metal", "Heavy Metal"),
-            ("Instrumental", "Instrumental"),
-            ("Jazz", "Jazz"),
-            ("Musical Theatre", "Musical Theatre"),
-            ("Pop", "Pop"),
-            ("Punk", "Punk"),
-            ("R&B", "R&B"),
-            ("Reggae", "Reggae"),
-            ("Rock n Roll", "Rock n Roll"),
-            ("Soul", "Soul"),
-            ("Swing", "Swing"),
-            ("Other", "Other"),
-        ],
+        "genres", validators=[DataRequired()], choices=GENRE_CHOICES
     )
     facebook_link = StringField("facebook_link", validators=[URL()],)
     website = StringField("website", validators=[URL()])
     seeking_venue = SelectField(
-        "seeking_venue",
-        validators=[DataRequired()],
-        choices=[("Yes", "Yes"), ("No", "No")],
+        "seeking_venue", validators=[DataRequired()], choices=YES_NO_CHOICES
     )
     seeking_description = StringField("seeking_description")
+    # the version the edit form was loaded at, see save_edit()
+    version = HiddenField("version")
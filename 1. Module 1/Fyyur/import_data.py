@@ -0,0 +1,290 @@
+"""Bulk import venues, artists or shows from CSV or JSON files.
+
+Rows are streamed in chunks, validated with the same WTForms classes as the
+create pages, and written with one COPY (Postgres) or executemany insert per
+chunk. Invalid rows are reported and skipped; they never abort the import.
+
+    python import_data.py venues venues.csv
+    python import_data.py shows shows.jsonl --chunk-size 10000 --errors bad.csv
+
+CSV columns and JSON keys match the form field names. Genres are a list in
+JSON and a ";" separated string in CSV. Shows reference their artist and
+venue by ``artist_id``/``venue_id`` or by ``artist_name``/``venue_name``.
+
+Cached pages and facet counts are invalidated through the cache backend,
+so running web workers see the import at once only when they share it
+(``CACHE_REDIS_URL``). With the default in-process cache they show it once
+their entries expire or they are restarted.
+"""
+import argparse
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+from werkzeug.datastructures import MultiDict
+
+import facets
+from app import app, db, cache, Venue, Artist, Show, count_upcoming
+from cache import LRUBackend
+from forms import VenueForm, ArtistForm, ShowForm
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(path):
+    """Yield (line, row) pairs from a CSV, JSON array or JSON lines file."""
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(f)
+            for row in reader:
+                if row.get("genres") is not None:
+                    row["genres"] = [g.strip() for g in row["genres"].split(";")]
+                yield reader.line_num, row
+            return
+        first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            yield from enumerate(json.load(f), start=1)
+            return
+        for line, text in enumerate(f, start=1):
+            if text.strip():
+                yield line, json.loads(text)
+
+
+def validate(form_class, row):
+    """Run ``row`` through ``form_class`` and return the validated form."""
+    items = list()
+    for key, value in row.items():
+        if isinstance(value, list):
+            items.extend((key, v) for v in value)
+        elif value is not None:
+            items.append((key, str(value)))
+    form = form_class(formdata=MultiDict(items), meta={"csrf": False})
+    if not form.validate():
+        raise RowError(
+            "; ".join(
+                f"{field}: {', '.join(messages)}"
+                for field, messages in form.errors.items()
+            )
+        )
+    return form
+
+
+def venue_values(form):
+    return {
+        "name": form.name.data,
+        "city": form.city.data,
+        "state": form.state.data,
+        "address": form.address.data,
+        "phone": form.phone.data,
+        "genres": form.genres.data,
+        "facebook_link": form.facebook_link.data,
+        "website": form.website.data,
+        "image_link": form.image_link.data,
+        "seeking_talent": form.seeking_talent.data == "Yes",
+        "seeking_description": form.seeking_description.data,
+    }
+
+
+def artist_values(form):
+    return {
+        "name": form.name.data,
+        "city": form.city.data,
+        "state": form.state.data,
+        "phone": form.phone.data,
+        "genres": form.genres.data,
+        "facebook_link": form.facebook_link.data,
+        "website": form.website.data,
+        "image_link": form.image_link.data,
+        "seeking_venue": form.seeking_venue.data == "Yes",
+        "seeking_description": form.seeking_description.data,
+    }
+
+
+def resolve(model, rows, key):
+    """Map the ``<key>_id``/``<key>_name`` references in ``rows`` to ids.
+
+    Runs one query per reference kind for the whole chunk.
+    """
+    ids = {r[f"{key}_id"] for r in rows if r.get(f"{key}_id")}
+    names = {r[f"{key}_name"] for r in rows if r.get(f"{key}_name")}
+    # soft deleted venues cannot get new shows
+    live = [model.deleted_at.is_(None)] if hasattr(model, "deleted_at") else []
+    known_ids = set()
+    if ids:
+        known_ids = {
+            i
+            for (i,) in db.session.query(model.id).filter(
+                model.id.in_([int(i) for i in ids if str(i).isdigit()]), *live
+            )
+        }
+    ids_by_name = dict()
+    if names:
+        found = db.session.query(model.name, model.id).filter(
+            model.name.in_(names), *live
+        )
+        for name, i in found:
+            # a name shared by several rows cannot be resolved
+            ids_by_name[name] = None if name in ids_by_name else i
+    return known_ids, ids_by_name
+
+
+def show_values(form, row, references):
+    values = dict()
+    for key in ("artist", "venue"):
+        known_ids, ids_by_name = references[key]
+        if row.get(f"{key}_name") and not row.get(f"{key}_id"):
+            ref = ids_by_name.get(row[f"{key}_name"])
+            if ref is None:
+                raise RowError(f"{key}_name: unknown or ambiguous {key}")
+        else:
+            ref = getattr(form, f"{key}_id").data
+            if not str(ref).isdigit() or int(ref) not in known_ids:
+                raise RowError(f"{key}_id: unknown {key}")
+        values[f"{key}_id"] = int(ref)
+    values["start_time"] = form.start_time.data
+    values["duration"] = form.duration.data
+    values["is_upcoming"] = values["start_time"] > datetime.now()
+    return values
+
+
+IMPORTS = {
+    "venues": (Venue, VenueForm, venue_values),
+    "artists": (Artist, ArtistForm, artist_values),
+    "shows": (Show, ShowForm, None),
+}
+
+
+def copy_value(value):
+    if isinstance(value, list):
+        return "{%s}" % ",".join(
+            '"%s"' % v.replace("\\", "\\\\").replace('"', '\\"') for v in value
+        )
+    return value
+
+
+def bulk_write(table, rows):
+    """Write ``rows`` with COPY on Postgres, executemany elsewhere."""
+    connection = db.session.connection()
+    if connection.dialect.name != "postgresql":
+        connection.execute(table.insert(), rows)
+        return
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    # non-numeric values are quoted so '' stays distinct from NULL (None)
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([copy_value(row[c]) for c in columns])
+    buffer.seek(0)
+    names = ", ".join(f'"{c}"' for c in columns)
+    connection.connection.cursor().copy_expert(
+        f'COPY "{table.name}" ({names}) FROM STDIN WITH CSV', buffer
+    )
+
+
+def write_chunk(table, rows):
+    """Write a chunk of (line, values) in one transaction.
+
+    If the bulk write fails, the chunk is retried row by row in savepoints
+    so only the offending rows are rejected. Returns the (line, error) list.
+    """
+    errors = list()
+    try:
+        bulk_write(table, [values for _, values in rows])
+        written = [values for _, values in rows]
+    except Exception:
+        db.session.rollback()
+        written = list()
+        for line, values in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(table.insert(), values)
+                written.append(values)
+            except Exception as e:
+                errors.append((line, str(getattr(e, "orig", e)).strip()))
+    if table is Show.__table__ and written:
+        count_upcoming(db.session.connection(), written)
+    db.session.commit()
+    return errors, len(written)
+
+
+def import_file(kind, path, chunk_size=5000, report=print):
+    """Import ``path`` into ``kind`` and return (imported, [(line, error)])."""
+    model, form_class, to_values = IMPORTS[kind]
+    rows = read_rows(path)
+    imported = 0
+    errors = list()
+    start = time.perf_counter()
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        if kind == "shows":
+            references = {
+                "artist": resolve(Artist, [row for _, row in chunk], "artist"),
+                "venue": resolve(Venue, [row for _, row in chunk], "venue"),
+            }
+        valid = list()
+        for line, row in chunk:
+            try:
+                form = validate(form_class, row)
+                if kind == "shows":
+                    valid.append((line, show_values(form, row, references)))
+                else:
+                    valid.append((line, to_values(form)))
+            except RowError as e:
+                errors.append((line, str(e)))
+        if valid:
+            chunk_errors, written = write_chunk(model.__table__, valid)
+            errors.extend(chunk_errors)
+            imported += written
+        elapsed = time.perf_counter() - start
+        report(
+            f"{imported} {kind} imported, {len(errors)} rejected, "
+            f"{imported / elapsed:.0f} rows/s"
+        )
+    # bulk writes skip the mapper events that bump the facet versions, and
+    # new shows change the counts on every detail page. The versions live in
+    # the cache backend, which only the Redis backend shares with the web
+    # workers.
+    facets.invalidate(cache, Venue)
+    facets.invalidate(cache, Artist)
+    cache.invalidate("venues", "artists")
+    if isinstance(cache.backend, LRUBackend):
+        report(
+            "the page cache is local to each process: web workers serve cached "
+            f"pages for up to {cache.default_ttl}s and facet counts for up to "
+            f"{facets.TTL}s, restart them to show the import now or set "
+            "CACHE_REDIS_URL"
+        )
+    return imported, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("kind", choices=sorted(IMPORTS))
+    parser.add_argument("path", help="a .csv, .json or .jsonl file")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--errors", help="write rejected rows to this CSV file")
+    args = parser.parse_args()
+
+    with app.app_context():
+        imported, errors = import_file(args.kind, args.path, args.chunk_size)
+    for line, error in errors[:20]:
+        print(f"line {line}: {error}")
+    if len(errors) > 20:
+        print(f"... and {len(errors) - 20} more")
+    if args.errors:
+        with open(args.errors, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["line", "error"])
+            writer.writerows(errors)
+
+
+if __name__ == "__main__":
+    main()
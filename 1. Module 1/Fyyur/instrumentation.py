@@ -0,0 +1,124 @@
+"""Per-request SQL instrumentation for Flask apps.
+
+Hooks the SQLAlchemy engine events to record, for every request, how many
+statements ran, the total time spent in the database and how often each
+statement fingerprint repeated. The numbers are sent back in the
+``Server-Timing`` and ``X-Query-Count`` response headers and logged as one
+JSON line per request on the ``sql`` logger.
+
+Setting ``SQL_STRICT_MAX_REPEATS`` makes a request fail with
+``RepeatedQueryError`` when one fingerprint ran more often than that, which
+catches N+1 query loops in tests. The violation is recorded when it happens
+and raised once the view has returned, so views catching errors around their
+queries cannot swallow it.
+
+The same file is kept in the Fyyur, trivia backend and Bookmarkie apps:
+they are installed and deployed separately and share no package, so each
+carries its own copy. Keep the copies identical.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("sql")
+
+_listening = False
+
+
+class RepeatedQueryError(AssertionError):
+    pass
+
+
+def fingerprint(statement):
+    """Normalize a statement so repeats with other IN-list sizes still match."""
+    statement = re.sub(r"\s+", " ", statement).strip()
+    return re.sub(r"IN \([^)]*\)", "IN (...)", statement)
+
+
+class RequestQueries:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        # the first RepeatedQueryError of the request, raised by finish()
+        self.violation = None
+
+    def duplicates(self, threshold=1):
+        return {s: n for s, n in self.fingerprints.items() if n > threshold}
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    if not has_app_context() or "sql_queries" not in g:
+        return
+    queries = g.sql_queries
+    queries.count += 1
+    queries.duration += elapsed
+    key = fingerprint(statement)
+    queries.fingerprints[key] += 1
+    limit = current_app.config.get("SQL_STRICT_MAX_REPEATS")
+    if (
+        limit is not None
+        and queries.fingerprints[key] > limit
+        and queries.violation is None
+    ):
+        queries.violation = RepeatedQueryError(
+            f"statement ran {queries.fingerprints[key]} times in one request "
+            f"(limit {limit}): {key}"
+        )
+
+
+class QueryInstrumentation:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        global _listening
+        app.config.setdefault("SQL_STRICT_MAX_REPEATS", None)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.extensions["sql_instrumentation"] = self
+        if not _listening:
+            event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+            _listening = True
+
+    def start(self):
+        g.sql_queries = RequestQueries()
+
+    def finish(self, response):
+        queries = g.pop("sql_queries", None)
+        if queries is None:
+            return response
+        duration = queries.duration * 1000
+        response.headers["X-Query-Count"] = str(queries.count)
+        response.headers.add(
+            "Server-Timing", f'db;dur={duration:.2f};desc="{queries.count} queries"'
+        )
+        logger.info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "endpoint": request.endpoint,
+                    "status": response.status_code,
+                    "queries": queries.count,
+                    "db_ms": round(duration, 2),
+                    "duplicates": queries.duplicates(),
+                }
+            )
+        )
+        if queries.violation is not None:
+            raise queries.violation
+        return response
@@ -0,0 +1,26 @@
+"""add name prefix indexes for autocomplete
+
+Revision ID: 5d8e0a4c7b19
+Revises: 7f3c21d9a6b4
+Create Date: 2026-10-18 16:27:09.541730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8e0a4c7b19'
+down_revision = '7f3c21d9a6b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_name_prefix', 'Venue', [sa.text('lower(name) text_pattern_ops')], unique=False)
+    op.create_index('ix_Artist_name_prefix', 'Artist', [sa.text('lower(name) text_pattern_ops')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_prefix', table_name='Artist')
+    op.drop_index('ix_Venue_name_prefix', table_name='Venue')
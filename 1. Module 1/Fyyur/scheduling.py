@@ -0,0 +1,242 @@
+"""Conflict checked show scheduling.
+
+A show occupies its venue and its artist from ``start_time`` for
+``duration`` minutes. ``schedule()`` checks a batch of bookings against the
+shows already in the database and against each other, and splits them into
+the rows that can be inserted and a conflict report.
+
+Only the shows that could collide with a booking are loaded: the bookings'
+own windows, [start - MAX_DURATION, end) for their venue and their artist,
+go into a temporary table that one query joins against the shows, so every
+window is one range probe of the ``(venue_id, start_time)`` or
+``(artist_id, start_time)`` index. The shows found are put in an interval
+index: one sorted list of disjoint busy intervals per venue and per artist,
+so each booking is checked with a binary search and accepted bookings are
+added to the index as they go.
+
+Start times are stored naive, in the server's local time like
+``datetime.now()``; offsets sent with a booking are converted to it.
+"""
+from bisect import bisect_right, insort
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table
+
+DEFAULT_DURATION = 120
+MAX_DURATION = 24 * 60
+
+# conflict reasons, with the message shown on the create show page
+REASONS = {
+    "invalid": "the artist, venue or start time is invalid",
+    "unknown_venue": "the venue does not exist",
+    "unknown_artist": "the artist does not exist",
+    "venue_booked": "the venue is already booked at that time",
+    "artist_booked": "the artist is already booked at that time",
+}
+
+# the window of every booking, for its venue and for its artist
+windows = Table(
+    "booking_windows",
+    MetaData(),
+    Column("venue_id", Integer, nullable=False),
+    Column("artist_id", Integer, nullable=False),
+    Column("low", DateTime, nullable=False),
+    Column("high", DateTime, nullable=False),
+    prefixes=["TEMPORARY"],
+    # never outlives the transaction on Postgres, even if a query fails
+    postgresql_on_commit="DROP",
+)
+
+
+class BookingError(Exception):
+    pass
+
+
+class IntervalIndex:
+    """Disjoint busy intervals per key, sorted by start."""
+
+    def __init__(self):
+        self.intervals = defaultdict(list)
+
+    def load(self, key, start, end, ref):
+        """Add an existing interval; call ``freeze()`` once all are loaded."""
+        self.intervals[key].append((start, end, ref))
+
+    def freeze(self):
+        """Sort the loaded intervals and merge the ones that overlap."""
+        for key, intervals in self.intervals.items():
+            intervals.sort()
+            merged = list()
+            for start, end, ref in intervals:
+                if merged and start < merged[-1][1]:
+                    last = merged[-1]
+                    merged[-1] = (last[0], max(last[1], end), last[2])
+                else:
+                    merged.append((start, end, ref))
+            self.intervals[key] = merged
+
+    def overlap(self, key, start, end):
+        """Return the ref of an interval overlapping [start, end), or None."""
+        intervals = self.intervals.get(key)
+        if not intervals:
+            return None
+        i = bisect_right(intervals, (start, datetime.max))
+        if i > 0 and intervals[i - 1][1] > start:
+            return intervals[i - 1][2]
+        if i < len(intervals) and intervals[i][0] < end:
+            return intervals[i][2]
+        return None
+
+    def add(self, key, start, end, ref):
+        insort(self.intervals[key], (start, end, ref))
+
+
+def parse_booking(booking):
+    """Validate one booking dict and return (artist_id, venue_id, start, minutes)."""
+    try:
+        artist_id = int(booking["artist_id"])
+        venue_id = int(booking["venue_id"])
+        start_time = booking["start_time"]
+        if not isinstance(start_time, datetime):
+            start_time = datetime.fromisoformat(str(start_time))
+        duration = int(booking.get("duration") or DEFAULT_DURATION)
+    except (KeyError, TypeError, ValueError) as e:
+        raise BookingError(f"invalid booking: {e}")
+    if not 0 < duration <= MAX_DURATION:
+        raise BookingError(f"duration must be between 1 and {MAX_DURATION} minutes")
+    if start_time.tzinfo is not None:
+        # to the server's local time, the naive start times are stored in
+        start_time = start_time.astimezone().replace(tzinfo=None)
+    return artist_id, venue_id, start_time, duration
+
+
+def existing_shows(db, Show, parsed):
+    """Return the shows starting inside any booking's venue or artist window."""
+    rows = [
+        {
+            "venue_id": venue_id,
+            "artist_id": artist_id,
+            "low": start_time - timedelta(minutes=MAX_DURATION),
+            "high": start_time + timedelta(minutes=duration),
+        }
+        for _, (artist_id, venue_id, start_time, duration) in parsed
+    ]
+    connection = db.session.connection()
+    windows.create(bind=connection)
+    try:
+        connection.execute(windows.insert(), rows)
+        columns = [Show.id, Show.venue_id, Show.artist_id, Show.start_time]
+        queries = [
+            db.select(columns + [Show.duration]).select_from(
+                windows.join(
+                    Show.__table__,
+                    db.and_(
+                        getattr(Show, owner) == windows.c[owner],
+                        Show.start_time >= windows.c.low,
+                        Show.start_time < windows.c.high,
+                    ),
+                )
+            )
+            for owner in ("venue_id", "artist_id")
+        ]
+        # UNION drops the shows found through both their venue and artist
+        shows = connection.execute(db.union(*queries)).fetchall()
+    except Exception:
+        # an aborted Postgres transaction refuses the DROP, which would hide
+        # the error; rolling it back drops the table there
+        if connection.dialect.name != "postgresql":
+            windows.drop(bind=connection)
+        raise
+    windows.drop(bind=connection)
+    return shows
+
+
+def schedule(db, Show, Venue, Artist, bookings):
+    """Check ``bookings`` and return (rows to insert, conflicts).
+
+    Each conflict is a dict with the booking ``index``, a ``reason`` and,
+    for overlaps, ``conflicts_with``: the existing ``show_id`` or the
+    earlier booking ``index`` it collides with. Bookings are accepted in
+    order, so the first of two overlapping bookings wins. The referenced
+    venues and artists are locked (``FOR UPDATE`` on Postgres) until the
+    caller commits, so concurrent batches cannot both book the same slot.
+    """
+    conflicts = list()
+    parsed = list()
+    for index, booking in enumerate(bookings):
+        try:
+            parsed.append((index, parse_booking(booking)))
+        except BookingError as e:
+            conflicts.append({"index": index, "reason": "invalid", "message": str(e)})
+    if not parsed:
+        return list(), conflicts
+
+    venue_ids = sorted({b[1] for _, b in parsed})
+    artist_ids = sorted({b[0] for _, b in parsed})
+    # expanding parameters skip compiling one bind per id in large batches
+    known_venues = {
+        i
+        for (i,) in db.session.query(Venue.id)
+        .filter(
+            Venue.id.in_(db.bindparam("venue_ids", expanding=True)),
+            Venue.deleted_at.is_(None),
+        )
+        .order_by(Venue.id)
+        .with_for_update()
+        .params(venue_ids=venue_ids)
+    }
+    known_artists = {
+        i
+        for (i,) in db.session.query(Artist.id)
+        .filter(Artist.id.in_(db.bindparam("artist_ids", expanding=True)))
+        .order_by(Artist.id)
+        .with_for_update()
+        .params(artist_ids=artist_ids)
+    }
+
+    busy = IntervalIndex()
+    # plain rows instead of ORM tuples
+    existing = existing_shows(db, Show, parsed)
+    spans = dict()
+    for show_id, venue_id, artist_id, start_time, duration in existing:
+        if duration not in spans:
+            spans[duration] = timedelta(minutes=duration)
+        end = start_time + spans[duration]
+        busy.load(("venue", venue_id), start_time, end, ("show_id", show_id))
+        busy.load(("artist", artist_id), start_time, end, ("show_id", show_id))
+    busy.freeze()
+
+    now = datetime.now()
+    rows = list()
+    for i, (artist_id, venue_id, start_time, duration) in parsed:
+        conflict = {"index": i}
+        end = start_time + timedelta(minutes=duration)
+        if venue_id not in known_venues:
+            conflict["reason"] = "unknown_venue"
+        elif artist_id not in known_artists:
+            conflict["reason"] = "unknown_artist"
+        else:
+            for kind, key in (("venue", venue_id), ("artist", artist_id)):
+                other = busy.overlap((kind, key), start_time, end)
+                if other is not None:
+                    conflict.update(
+                        reason=f"{kind}_booked", conflicts_with=dict([other])
+                    )
+                    break
+        if "reason" in conflict:
+            conflicts.append(conflict)
+            continue
+        busy.add(("venue", venue_id), start_time, end, ("index", i))
+        busy.add(("artist", artist_id), start_time, end, ("index", i))
+        rows.append(
+            {
+                "artist_id": artist_id,
+                "venue_id": venue_id,
+                "start_time": start_time,
+                "duration": duration,
+                "is_upcoming": start_time > now,
+            }
+        )
+    conflicts.sort(key=lambda c: c["index"])
+    return rows, conflicts
@@ -0,0 +1,128 @@
+"""Ranked name search for venues and artists.
+
+On Postgres, ``ILIKE '%term%'`` is served by a pg_trgm GIN index on the name
+column and matches are ranked by trigram ``similarity()``. On SQLite (used
+for local tests) the names are mirrored into an FTS5 table with the trigram
+tokenizer, kept in sync by triggers, and matches are ranked by bm25.
+
+Autocomplete uses a prefix match on ``lower(name)``, served on Postgres by a
+btree index with ``text_pattern_ops`` so only the matching range is read.
+Soft deleted rows (with ``deleted_at`` set) are never returned.
+"""
+from sqlalchemy import DDL, Float, Integer, event, func, text
+
+# FTS5 trigram queries need at least three characters
+MIN_FTS_TERM = 3
+
+
+def register(model, column="name"):
+    """Create the search index for ``model`` whenever its table is created.
+
+    Existing Postgres databases get the same index from the migrations.
+    """
+    table = model.__tablename__
+    fts = f"{table}_fts"
+    postgresql = [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}_trgm" '
+        f'ON "{table}" USING gin ({column} gin_trgm_ops)',
+        f'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}_prefix" '
+        f'ON "{table}" (lower({column}) text_pattern_ops)',
+    ]
+    sqlite = [
+        f'CREATE VIRTUAL TABLE "{fts}" USING fts5('
+        f"{column}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}"(rowid, {column}) VALUES (new.id, new.{column}); END',
+        f'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}"("{fts}", rowid, {column}) '
+        f"VALUES ('delete', old.id, old.{column}); END",
+        f'CREATE TRIGGER "{fts}_au" AFTER UPDATE OF {column} ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}"("{fts}", rowid, {column}) '
+        f"VALUES ('delete', old.id, old.{column}); "
+        f'INSERT INTO "{fts}"(rowid, {column}) VALUES (new.id, new.{column}); END',
+    ]
+    for statement in postgresql:
+        event.listen(
+            model.__table__,
+            "after_create",
+            DDL(statement).execute_if(dialect="postgresql"),
+        )
+    for statement in sqlite:
+        event.listen(
+            model.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite")
+        )
+    event.listen(
+        model.__table__,
+        "before_drop",
+        DDL(f'DROP TABLE IF EXISTS "{fts}"').execute_if(dialect="sqlite"),
+    )
+
+
+def escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def live(query, model):
+    if hasattr(model, "deleted_at"):
+        query = query.filter(model.deleted_at.is_(None))
+    return query
+
+
+def matches(db, model, term, *columns):
+    """Return the query of ``columns`` for rows matching ``term``, and its ranking.
+
+    The ranking is the list of ORDER BY clauses putting best matches first.
+    """
+    query = live(db.session.query(*columns).select_from(model), model)
+    dialect = db.session.get_bind(mapper=model.__mapper__).dialect.name
+
+    if dialect == "sqlite" and len(term) >= MIN_FTS_TERM:
+        fts = f"{model.__tablename__}_fts"
+        matched = (
+            text(f'SELECT rowid AS id, rank FROM "{fts}" WHERE "{fts}" MATCH :term')
+            .bindparams(term='"' + term.replace('"', '""') + '"')
+            .columns(id=Integer, rank=Float)
+            .alias("matches")
+        )
+        query = query.join(matched, matched.c.id == model.id)
+        return query, [matched.c.rank, model.id]
+
+    query = query.filter(model.name.ilike(f"%{escape_like(term)}%", escape="\\"))
+    if dialect == "postgresql":
+        return query, [func.similarity(model.name, term).desc(), model.id]
+    return query, [model.name, model.id]
+
+
+def ranked_search(db, model, term, limit, offset=0):
+    """Find up to ``limit`` ``model`` rows whose name contains ``term``.
+
+    Best matches come first, skipping the first ``offset``. Returns (id,
+    name, num_upcoming_shows) rows.
+    """
+    query, ranking = matches(
+        db, model, term, model.id, model.name, model.num_upcoming_shows
+    )
+    return query.order_by(*ranking).offset(offset).limit(limit).all()
+
+
+def count_matches(db, model, term):
+    """Count the ``model`` rows whose name contains ``term``."""
+    query, _ = matches(db, model, term, func.count(model.id))
+    return query.scalar()
+
+
+def prefix_search(db, model, prefix, limit=10):
+    """Return up to ``limit`` (id, name) rows whose name starts with ``prefix``.
+
+    Matching ignores case; on Postgres only the index range for the prefix
+    is scanned.
+    """
+    pattern = escape_like(prefix.lower()) + "%"
+    return (
+        live(db.session.query(model.id, model.name), model)
+        .filter(func.lower(model.name).like(pattern, escape="\\"))
+        .order_by(func.lower(model.name), model.id)
+        .limit(limit)
+        .all()
+    )
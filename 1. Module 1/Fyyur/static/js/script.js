@@ -2,3 +2,30 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// fill the datalist of inputs with a data-autocomplete url as the user types
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+  var options = document.getElementById(input.getAttribute('list'));
+  var timer = null;
+  var last = '';
+  input.addEventListener('input', function () {
+    var q = input.value.trim();
+    clearTimeout(timer);
+    // ids typed directly and repeated prefixes need no lookup
+    if (!q || /^\d+$/.test(q) || q === last) return;
+    timer = setTimeout(function () {
+      last = q;
+      fetch(input.dataset.autocomplete + '?q=' + encodeURIComponent(q))
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          options.innerHTML = '';
+          data.results.forEach(function (result) {
+            var option = document.createElement('option');
+            option.value = result.id;
+            option.label = result.name;
+            options.appendChild(option);
+          });
+        });
+    }, 200);
+  });
+});
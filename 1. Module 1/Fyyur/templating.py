@@ -0,0 +1,94 @@
+"""Template loading and render timing for Flask apps.
+
+With ``JINJA_BYTECODE_CACHE_DIR`` set, compiled templates are kept on disk,
+so a new worker loads bytecode instead of parsing and compiling every
+template again. ``JINJA_PRECOMPILE`` loads every template when the app
+starts, which surfaces template errors at deploy time and takes the compile
+cost off the first requests. Together with ``TEMPLATES_AUTO_RELOAD = False``
+templates are then never checked for changes on disk again.
+
+Every ``render_template`` call is timed per page template (the time of the
+layouts it extends is included). The renders of a request are added to its
+``Server-Timing`` header, and ``stats()`` aggregates them per template for
+the worker.
+"""
+import os
+import time
+from threading import Lock
+
+from flask import current_app, g, has_app_context
+from jinja2 import FileSystemBytecodeCache, Template
+
+
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if has_app_context() and "templates" in current_app.extensions:
+                current_app.extensions["templates"].record(self.name, elapsed)
+
+
+def precompile(env, extensions=("html",)):
+    """Load every template of ``env``, return how many were loaded."""
+    names = env.list_templates(extensions=extensions)
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+class Templates:
+    def __init__(self, app=None):
+        self.lock = Lock()
+        self.renders = dict()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("JINJA_BYTECODE_CACHE_DIR", None)
+        app.config.setdefault("JINJA_PRECOMPILE", False)
+        env = app.jinja_env
+        # templates loaded from now on are timed
+        env.template_class = TimedTemplate
+        cache_dir = app.config["JINJA_BYTECODE_CACHE_DIR"]
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        app.after_request(self.finish)
+        app.extensions["templates"] = self
+        if app.config["JINJA_PRECOMPILE"]:
+            precompile(env)
+
+    def record(self, name, elapsed):
+        if "template_renders" in g:
+            g.template_renders.append((name, elapsed))
+        else:
+            g.template_renders = [(name, elapsed)]
+        with self.lock:
+            count, total, slowest = self.renders.get(name, (0, 0.0, 0.0))
+            self.renders[name] = (count + 1, total + elapsed, max(slowest, elapsed))
+
+    def finish(self, response):
+        for name, elapsed in g.pop("template_renders", ()):
+            response.headers.add(
+                "Server-Timing", f'tpl;dur={elapsed * 1000:.2f};desc="{name}"'
+            )
+        return response
+
+    def stats(self):
+        with self.lock:
+            renders = dict(self.renders)
+        return {
+            name: {
+                "renders": count,
+                "mean_ms": round(total / count * 1000, 3),
+                "max_ms": round(slowest * 1000, 3),
+            }
+            for name, (count, total, slowest) in sorted(renders.items())
+        }
+
+    def reset(self):
+        with self.lock:
+            self.renders.clear()
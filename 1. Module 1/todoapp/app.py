@@ -1,6 +1,10 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, abort
+from flask import Flask, render_template, request, jsonify, abort, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+import coalesce
+import events
+import json
+import os
 import sys
 
 app = Flask(__name__)
@@ -9,19 +13,32 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
+# Committed changes are pushed to /todos/events, see events.py. With several
+# workers set TODO_EVENTS_NOTIFY=1 to relay them through Postgres.
+bus = events.Bus()
+notify = events.PostgresNotify(bus) if os.environ.get('TODO_EVENTS_NOTIFY') == '1' else None
+if notify:
+  notify.install(db.session)
+else:
+  events.install(db.session, bus)
+
 class Todo(db.Model):
   __tablename__ = 'todos'
   id = db.Column(db.Integer, primary_key=True)
   description = db.Column(db.String(), nullable=False)
   completed = db.Column(db.Boolean, nullable=False)
 
+  # serves the keyset pages, with or without the completed filter
+  __table_args__ = (db.Index('ix_todos_completed_id', 'completed', 'id'),)
+
   def __repr__(self):
     return f'<Todo {self.id} {self.description}>'
 
 @app.route('/todos/<todo_id>', methods=['DELETE'])
 def delete_todo(todo_id):
   try:
-    Todo.query.filter_by(id=todo_id).delete()
+    if Todo.query.filter_by(id=todo_id).delete():
+      events.record(db.session, {'op': 'delete', 'id': int(todo_id)})
     db.session.commit()
   except:
     db.session.rollback()
@@ -40,6 +57,9 @@ def create_todo():
     description = request.get_json()['description']
     todo = Todo(description=description, completed=False)
     db.session.add(todo)
+    db.session.flush()
+    events.record(db.session, {'op': 'create', 'id': todo.id,
+      'description': todo.description, 'completed': todo.completed})
     db.session.commit()
     body['id'] = todo.id
     body['completed'] = todo.completed
@@ -55,20 +75,220 @@ def create_todo():
   else:
     return jsonify(body)
 
-@app.route('/todos/<todo_id>/set-completed', methods=['POST'])
+# Completion toggles are coalesced, see coalesce.py: the toggles arriving
+# within TOGGLE_WINDOW seconds are written by one UPDATE, and each request
+# answers once its toggle is committed. Toggling a missing todo answers 404.
+TOGGLE_WINDOW = 0.01
+TOGGLE_TIMEOUT = 5
+
+def write_toggles(changes):
+  """Set completed for {todo id: completed} with one UPDATE and commit.
+
+  Returns the ids of the todos written, the others no longer exist.
+  """
+  try:
+    # locked so none of them is deleted before the UPDATE
+    existing = {id for id, in db.session.query(Todo.id)
+      .filter(Todo.id.in_(changes)).with_for_update()}
+    changes = {id: completed for id, completed in changes.items() if id in existing}
+    if changes:
+      Todo.query.filter(Todo.id.in_(changes)).update(
+        {'completed': db.case(changes, value=Todo.id)}, synchronize_session=False)
+    for todo_id, completed in changes.items():
+      events.record(db.session, {'op': 'complete', 'id': todo_id, 'completed': completed})
+    db.session.commit()
+    return set(changes)
+  except:
+    db.session.rollback()
+    raise
+  finally:
+    db.session.close()
+
+toggles = coalesce.ToggleBuffer(app, write_toggles, TOGGLE_WINDOW)
+
+@app.route('/todos/<int:todo_id>/set-completed', methods=['POST'])
 def set_completed_todo(todo_id):
+  completed = (request.get_json(silent=True) or {}).get('completed')
+  if not isinstance(completed, bool):
+    abort(400)
   try:
-    completed = request.get_json()['completed']
-    print('completed', completed)
-    todo = Todo.query.get(todo_id)
-    todo.completed = completed
+    batch = toggles.toggle(todo_id, completed)
+    batch.wait(TOGGLE_TIMEOUT)
+  except Exception:
+    abort(500)
+  if todo_id not in batch.written:
+    abort(404)
+  return jsonify({'success': True, 'id': todo_id, 'completed': completed})
+
+# Batch mutations: POST /todos/batch with
+# {"operations": [{"op": "create", "description": "..."},
+#                 {"op": "complete", "id": 1, "completed": true},
+#                 {"op": "delete", "id": 2}, ...]}
+# applies every operation in one transaction with one statement per kind
+# (creates are inserted first, then completions, then deletions) and
+# returns one result per operation, in order. Ids must refer to todos that
+# existed before the batch; a missing id fails only its own operation.
+BATCH_MAX_OPERATIONS = 1000
+
+def parse_operations(body):
+  operations = body.get('operations') if isinstance(body, dict) else None
+  if not isinstance(operations, list) or not operations:
+    raise ValueError('operations must be a non-empty list')
+  if len(operations) > BATCH_MAX_OPERATIONS:
+    raise ValueError(f'at most {BATCH_MAX_OPERATIONS} operations per batch')
+  for operation in operations:
+    op = operation.get('op') if isinstance(operation, dict) else None
+    if op == 'create':
+      if not isinstance(operation.get('description'), str) or not operation['description']:
+        raise ValueError('create needs a description')
+    elif op in ('complete', 'delete'):
+      if not isinstance(operation.get('id'), int) or isinstance(operation['id'], bool):
+        raise ValueError(f'{op} needs an integer id')
+      if op == 'complete' and not isinstance(operation.get('completed'), bool):
+        raise ValueError('complete needs completed true or false')
+    else:
+      raise ValueError(f'unknown op {op!r}')
+  return operations
+
+def insert_todos(descriptions):
+  """Insert todos in one statement where the database can return the ids."""
+  if not descriptions:
+    return []
+  if db.engine.dialect.name == 'postgresql':
+    rows = [{'description': d, 'completed': False} for d in descriptions]
+    # multi-row VALUES returns the ids in insertion order
+    return [id for id, in db.session.execute(
+      Todo.__table__.insert().values(rows).returning(Todo.id))]
+  todos = [Todo(description=d, completed=False) for d in descriptions]
+  db.session.add_all(todos)
+  db.session.flush()
+  return [todo.id for todo in todos]
+
+def apply_batch(operations):
+  ids = {o['id'] for o in operations if o['op'] != 'create'}
+  existing = set()
+  if ids:
+    existing = {id for id, in db.session.query(Todo.id).filter(Todo.id.in_(ids))}
+  created = iter(insert_todos(
+    [o['description'] for o in operations if o['op'] == 'create']))
+  # the last completion of an id wins, one UPDATE per target value
+  completions = {o['id']: o['completed'] for o in operations
+    if o['op'] == 'complete' and o['id'] in existing}
+  for completed in (True, False):
+    todo_ids = [id for id, value in completions.items() if value is completed]
+    if todo_ids:
+      Todo.query.filter(Todo.id.in_(todo_ids)).update(
+        {'completed': completed}, synchronize_session=False)
+  deleted = {o['id'] for o in operations if o['op'] == 'delete'} & existing
+  if deleted:
+    Todo.query.filter(Todo.id.in_(deleted)).delete(synchronize_session=False)
+  results = []
+  for operation in operations:
+    if operation['op'] == 'create':
+      results.append({'op': 'create', 'success': True, 'id': next(created),
+        'description': operation['description'], 'completed': False})
+    else:
+      result = {'op': operation['op'], 'id': operation['id'],
+        'success': operation['id'] in existing}
+      if operation['op'] == 'complete':
+        result['completed'] = operation['completed']
+      if not result['success']:
+        result['error'] = 'not found'
+      results.append(result)
+  return results
+
+@app.route('/todos/batch', methods=['POST'])
+def batch_todos():
+  try:
+    operations = parse_operations(request.get_json())
+  except ValueError as e:
+    return jsonify({'success': False, 'error': str(e)}), 400
+  error = False
+  try:
+    results = apply_batch(operations)
+    for result in results:
+      if result['success']:
+        events.record(db.session,
+          {key: value for key, value in result.items() if key != 'success'})
     db.session.commit()
   except:
+    error = True
     db.session.rollback()
+    print(sys.exc_info())
   finally:
     db.session.close()
-  return redirect(url_for('index'))
+  if error:
+    abort(500)
+  return jsonify({'success': True, 'results': results})
+
+# Listing: pages are keyset paginated on id, ?after=<last id seen> reads
+# the next TODOS_PER_PAGE todos from the index however deep the page is,
+# and ?completed=true|false filters on the (completed, id) index.
+TODOS_PER_PAGE = 100
+TODOS_MAX_PER_PAGE = 1000
+EXPORT_CHUNK_SIZE = 1000
+
+def todo_filters():
+  """Return (after, completed) from the query string, 400 when invalid."""
+  after = request.args.get('after', 0, type=int)
+  completed = request.args.get('completed')
+  if completed not in (None, '', 'true', 'false'):
+    abort(400)
+  return after, None if not completed else completed == 'true'
+
+def todos_query(completed=None):
+  query = Todo.query.order_by(Todo.id)
+  if completed is not None:
+    query = query.filter(Todo.completed == completed)
+  return query
+
+def todos_page(after, completed, limit=TODOS_PER_PAGE):
+  """Return the todos after id ``after`` and the id to continue after, or None."""
+  todos = todos_query(completed).filter(Todo.id > after).limit(limit + 1).all()
+  if len(todos) > limit:
+    return todos[:limit], todos[limit - 1].id
+  return todos, None
+
+def todo_json(todo):
+  return {'id': todo.id, 'description': todo.description, 'completed': todo.completed}
+
+@app.route('/todos')
+def list_todos():
+  after, completed = todo_filters()
+  limit = min(max(request.args.get('limit', TODOS_PER_PAGE, type=int), 1), TODOS_MAX_PER_PAGE)
+  todos, next_after = todos_page(after, completed, limit)
+  return jsonify({'todos': [todo_json(todo) for todo in todos], 'next': next_after})
+
+@app.route('/todos/export')
+def export_todos():
+  """Stream every todo as JSON lines, holding one chunk in memory at a time."""
+  _, completed = todo_filters()
+  query = todos_query(completed).yield_per(EXPORT_CHUNK_SIZE)
+
+  def generate():
+    try:
+      for todo in query:
+        yield json.dumps(todo_json(todo)) + '\n'
+    finally:
+      db.session.close()
+
+  return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/todos/events')
+def todo_events():
+  """Server-sent events with the changes of every commit, see events.py."""
+  if notify:
+    notify.start(db.engine)
+  subscription = bus.subscribe(request.headers.get('Last-Event-ID'))
+  response = Response(events.stream(subscription), mimetype='text/event-stream',
+    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+  response.call_on_close(lambda: bus.unsubscribe(subscription))
+  return response
 
 @app.route('/')
 def index():
-  return render_template('index.html', todos=Todo.query.order_by('id').all())
\ No newline at end of file
+  after, completed = todo_filters()
+  todos, next_after = todos_page(after, completed)
+  completed_filter = '' if completed is None else str(completed).lower()
+  return render_template('index.html', todos=todos, next_after=next_after,
+    completed=completed_filter)
\ No newline at end of file
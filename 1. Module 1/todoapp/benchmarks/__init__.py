@@ -0,0 +1,50 @@
+"""Helpers shared by the todoapp benchmarks.
+
+Benchmarks run against the database in ``BENCH_DATABASE_URL`` (a local
+``todoapp_bench`` Postgres database by default), never the app database,
+and are started from the todoapp directory with
+``python -m benchmarks.<name>``.
+"""
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+BENCH_DATABASE_URL = os.environ.get(
+  'BENCH_DATABASE_URL', 'postgres://amy@localhost:5432/todoapp_bench')
+
+def setup_app(database_url=BENCH_DATABASE_URL):
+  """Point the todoapp at the benchmark database and return it."""
+  import app as todoapp
+
+  todoapp.app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+  return todoapp
+
+def seed(db, todos):
+  """Drop and recreate the schema with ``todos`` open todos."""
+  from app import Todo
+
+  db.drop_all()
+  db.create_all()
+  db.session.execute(Todo.__table__.insert(),
+    [{'description': f'Todo {i}', 'completed': False} for i in range(todos)])
+  db.session.commit()
+
+@contextmanager
+def count_commits(engine):
+  """Count the statements and the commits the engine runs inside the block."""
+  counts = {'statements': 0, 'commits': 0}
+
+  def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    counts['statements'] += 1
+
+  def commit(conn):
+    counts['commits'] += 1
+
+  event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+  event.listen(engine, 'commit', commit)
+  try:
+    yield counts
+  finally:
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    event.remove(engine, 'commit', commit)
@@ -0,0 +1,72 @@
+"""Benchmark the batch endpoint against the per-item todo routes.
+
+Creates, completes and then deletes ``--todos`` todos, once with one request
+per todo through the single-item routes and once with one request to
+``/todos/batch`` per step, and reports requests, commits, statements and
+wall time for each.
+
+    python -m benchmarks.bench_batch [--todos 500] [--database postgres://...]
+"""
+import argparse
+import time
+
+from benchmarks import BENCH_DATABASE_URL, count_commits, seed, setup_app
+
+def per_item(ids, todos):
+  """Run the steps through the single-item routes, one request per todo."""
+  yield 'create', [
+    ('post', '/todos/create', {'description': f'New {i}'}) for i in range(todos)]
+  yield 'complete', [
+    ('post', f'/todos/{id}/set-completed', {'completed': True}) for id in ids]
+  yield 'delete', [('delete', f'/todos/{id}', None) for id in ids]
+
+def batched(ids, todos):
+  """Run the steps through /todos/batch, one request per step."""
+  def batch(operations):
+    return [('post', '/todos/batch', {'operations': operations})]
+
+  yield 'create', batch(
+    [{'op': 'create', 'description': f'New {i}'} for i in range(todos)])
+  yield 'complete', batch(
+    [{'op': 'complete', 'id': id, 'completed': True} for id in ids])
+  yield 'delete', batch([{'op': 'delete', 'id': id} for id in ids])
+
+def run(todoapp, steps, todos):
+  """Return {step: (requests, commits, statements, ms)} for one strategy."""
+  db = todoapp.db
+  with todoapp.app.app_context():
+    seed(db, todos)
+    ids = [id for id, in db.session.query(todoapp.Todo.id).order_by('id')]
+    db.session.remove()
+    client = todoapp.app.test_client()
+    results = {}
+    for step, requests in steps(ids, todos):
+      with count_commits(db.engine) as counts:
+        start = time.perf_counter()
+        for method, path, body in requests:
+          response = getattr(client, method)(path, json=body)
+          assert response.status_code < 400, (path, response.status_code)
+        elapsed = time.perf_counter() - start
+      results[step] = (len(requests), counts['commits'], counts['statements'], elapsed * 1000)
+    return results
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--todos', type=int, default=500)
+  parser.add_argument('--database', default=BENCH_DATABASE_URL)
+  args = parser.parse_args()
+
+  todoapp = setup_app(args.database)
+  print(f'{args.todos} todos')
+  print(f"  {'step':<10} {'strategy':<10} {'requests':>9} {'commits':>8} {'statements':>11} {'ms':>10}")
+  results = {
+    'per item': run(todoapp, per_item, args.todos),
+    'batch': run(todoapp, batched, args.todos),
+  }
+  for step in ('create', 'complete', 'delete'):
+    for strategy, steps in results.items():
+      requests, commits, statements, ms = steps[step]
+      print(f'  {step:<10} {strategy:<10} {requests:>9} {commits:>8} {statements:>11} {ms:>10.2f}')
+
+if __name__ == '__main__':
+  main()
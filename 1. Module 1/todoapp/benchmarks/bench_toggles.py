@@ -0,0 +1,72 @@
+"""Measure coalesced completion toggles under a burst of clicks.
+
+``--clients`` threads each click ``--clicks`` checkboxes of ``--todos``
+todos as fast as the answers come back, once per toggle window (0 writes
+every toggle by itself, as before coalescing), and reports commits,
+statements, click latency percentiles and clicks per second for each.
+
+    python -m benchmarks.bench_toggles [--clients 8] [--clicks 100]
+        [--todos 50] [--windows 0,0.01,0.05] [--database postgres://...]
+"""
+import argparse
+import random
+import threading
+import time
+
+from benchmarks import BENCH_DATABASE_URL, count_commits, seed, setup_app
+
+def percentile(values, p):
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def burst(todoapp, ids, clients, clicks):
+  """Return the latency of every click, in ms, and the wall time in seconds."""
+  latencies = []
+  barrier = threading.Barrier(clients)
+
+  def client(n):
+    rng = random.Random(n)
+    test_client = todoapp.app.test_client()
+    barrier.wait()
+    for _ in range(clicks):
+      start = time.perf_counter()
+      response = test_client.post(f'/todos/{rng.choice(ids)}/set-completed',
+        json={'completed': rng.random() < 0.5})
+      latencies.append((time.perf_counter() - start) * 1000)
+      assert response.status_code == 200, response.status_code
+
+  threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+  start = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  return latencies, time.perf_counter() - start
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--clients', type=int, default=8)
+  parser.add_argument('--clicks', type=int, default=100, help='per client')
+  parser.add_argument('--todos', type=int, default=50)
+  parser.add_argument('--windows', default='0,0.01,0.05', help='seconds, comma separated')
+  parser.add_argument('--database', default=BENCH_DATABASE_URL)
+  args = parser.parse_args()
+
+  todoapp = setup_app(args.database)
+  with todoapp.app.app_context():
+    seed(todoapp.db, args.todos)
+    ids = [id for id, in todoapp.db.session.query(todoapp.Todo.id)]
+    todoapp.db.session.remove()
+    engine = todoapp.db.engine
+  print(f'{args.clients} clients x {args.clicks} clicks over {args.todos} todos')
+  print(f"  {'window s':>8} {'commits':>8} {'statements':>11} {'p50 ms':>8} {'p95 ms':>8} {'clicks/s':>9}")
+  for window in [float(w) for w in args.windows.split(',')]:
+    todoapp.toggles.window = window
+    with count_commits(engine) as counts:
+      latencies, elapsed = burst(todoapp, ids, args.clients, args.clicks)
+    print(f"  {window:>8} {counts['commits']:>8} {counts['statements']:>11} "
+      f"{percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f} "
+      f"{len(latencies) / elapsed:>9.0f}")
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,91 @@
+"""Coalesce completion toggles into one UPDATE per short window.
+
+A click on a checkbox is one request, and a user clearing a list or a few
+clients clicking at once send many of them within milliseconds. Instead of
+committing each, ``ToggleBuffer.toggle()`` adds the toggle to the pending
+batch, where a later toggle of the same todo replaces the earlier one, and
+the first toggle of a batch schedules its flush ``window`` seconds later.
+The flush writes the whole batch in one transaction.
+
+Requests wait for the flush of their batch before answering, so an
+acknowledged toggle is committed: the window trades a little latency for
+far fewer commits. Flushes run one at a time, in order, so a newer batch
+never overwrites a newer value with an older one.
+"""
+import sys
+import threading
+
+class Batch:
+  """Toggles flushed together, as {todo id: completed}, and once flushed
+  the ids of the todos actually written."""
+
+  def __init__(self):
+    self.changes = {}
+    self.written = set()
+    self.toggles = 0
+    self.error = None
+    self.done = threading.Event()
+
+  def wait(self, timeout=None):
+    """Block until the batch is flushed, raise if the flush failed."""
+    if not self.done.wait(timeout):
+      raise TimeoutError('toggle not flushed in time')
+    if self.error is not None:
+      raise self.error
+
+class ToggleBuffer:
+  """Buffer toggles and hand each batch to ``flush(changes)``.
+
+  ``flush`` runs inside an app context of ``app``, must commit and returns
+  the ids it wrote, leaving out todos that no longer exist. With a
+  ``window`` of 0 every toggle is flushed by itself, in the request.
+  """
+
+  def __init__(self, app, flush, window=0.01):
+    self.app = app
+    self.flush_changes = flush
+    self.window = window
+    self.batch = None
+    self.lock = threading.Lock()
+    self.flushing = threading.Lock()
+    self.stats = {'toggles': 0, 'flushes': 0, 'rows': 0}
+
+  def toggle(self, todo_id, completed):
+    """Add a toggle and return the Batch it will be flushed with."""
+    if not self.window:
+      batch = Batch()
+      batch.changes[todo_id] = completed
+      batch.toggles = 1
+      self.write(batch)
+      return batch
+    with self.lock:
+      if self.batch is None:
+        self.batch = Batch()
+        timer = threading.Timer(self.window, self.flush)
+        timer.daemon = True
+        timer.start()
+      self.batch.changes[todo_id] = completed
+      self.batch.toggles += 1
+      return self.batch
+
+  def flush(self):
+    # taken before the batch is detached, so batches are written in order
+    with self.flushing:
+      with self.lock:
+        batch, self.batch = self.batch, None
+      if batch is not None:
+        with self.app.app_context():
+          self.write(batch)
+
+  def write(self, batch):
+    try:
+      batch.written = self.flush_changes(batch.changes)
+      with self.lock:
+        self.stats['toggles'] += batch.toggles
+        self.stats['flushes'] += 1
+        self.stats['rows'] += len(batch.written)
+    except Exception as e:
+      print('toggle flush failed', sys.exc_info())
+      batch.error = e
+    finally:
+      batch.done.set()
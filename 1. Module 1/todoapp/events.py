@@ -0,0 +1,217 @@
+"""Push todo changes to clients as server-sent events.
+
+Routes record each change on the session with ``record()``. When the
+session commits, the changes of the transaction go out as one event on the
+in-process Bus that every open /todos/events stream subscribes to; a rolled
+back transaction publishes nothing.
+
+A Bus only reaches the clients of its own process. With several workers,
+``PostgresNotify`` sends the changes with NOTIFY inside the committing
+transaction instead, and a thread in every worker LISTENs and relays them
+to the local Bus.
+"""
+import json
+import select
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+from sqlalchemy import event
+
+# sent instead of events a client may have missed, it reloads the list
+RESET = (None, 'reset')
+
+class Subscription:
+  """The events waiting for one stream, dropped in favour of RESET when the
+  client reads slower than ``size`` events behind."""
+
+  def __init__(self, size):
+    self.size = size
+    self.events = deque()
+    self.overflowed = False
+    self.ready = threading.Condition()
+
+  def put(self, item):
+    with self.ready:
+      if item is RESET or len(self.events) >= self.size:
+        self.events.clear()
+        self.overflowed = True
+      else:
+        self.events.append(item)
+      self.ready.notify()
+
+  def get(self, timeout):
+    """Return the next (id, changes), RESET, or None after ``timeout``."""
+    with self.ready:
+      self.ready.wait_for(lambda: self.events or self.overflowed, timeout)
+      if self.overflowed:
+        self.overflowed = False
+        return RESET
+      return self.events.popleft() if self.events else None
+
+class Bus:
+  """In-process pub/sub of committed changes.
+
+  Event ids are ``<bus token>-<sequence>``. The last ``history`` events are
+  kept so a reconnecting client sending Last-Event-ID gets what it missed,
+  or RESET when they are gone or the id is from another process.
+  """
+
+  def __init__(self, history=1000, queue_size=1000):
+    self.token = uuid.uuid4().hex[:8]
+    self.queue_size = queue_size
+    self.history = deque(maxlen=history)
+    self.sequence = 0
+    self.subscribers = set()
+    self.lock = threading.Lock()
+
+  def publish(self, changes):
+    with self.lock:
+      self.sequence += 1
+      item = (f'{self.token}-{self.sequence}', changes)
+      self.history.append(item)
+      for subscription in self.subscribers:
+        subscription.put(item)
+
+  def reset(self):
+    """Tell every client to reload, after changes may have been lost."""
+    with self.lock:
+      # ids handed out so far can no longer be replayed
+      self.token = uuid.uuid4().hex[:8]
+      self.history.clear()
+      for subscription in self.subscribers:
+        subscription.put(RESET)
+
+  def missed(self, last_event_id):
+    """Return the events after ``last_event_id``, None when not all are kept."""
+    token, _, sequence = last_event_id.partition('-')
+    if token != self.token or not sequence.isdigit():
+      return None
+    count = self.sequence - int(sequence)
+    if count < 0 or count > len(self.history):
+      return None
+    return list(self.history)[len(self.history) - count:]
+
+  def subscribe(self, last_event_id=None):
+    subscription = Subscription(self.queue_size)
+    with self.lock:
+      if last_event_id:
+        missed = self.missed(last_event_id)
+        for item in [RESET] if missed is None else missed:
+          subscription.put(item)
+      self.subscribers.add(subscription)
+    return subscription
+
+  def unsubscribe(self, subscription):
+    with self.lock:
+      self.subscribers.discard(subscription)
+
+def record(session, change):
+  """Queue ``change`` to be published when ``session`` commits."""
+  session.info.setdefault('todo_changes', []).append(change)
+
+def install(session, bus):
+  """Publish the recorded changes of ``session`` on ``bus`` after commit."""
+  @event.listens_for(session, 'after_commit')
+  def publish(session):
+    changes = session.info.pop('todo_changes', None)
+    if changes:
+      bus.publish(changes)
+
+  @event.listens_for(session, 'after_soft_rollback')
+  def discard(session, previous_transaction):
+    session.info.pop('todo_changes', None)
+
+def stream(subscription, keepalive=15):
+  """Yield the SSE messages for ``subscription``, with a comment line every
+  ``keepalive`` seconds so proxies keep the connection open."""
+  yield 'retry: 3000\n\n'
+  while True:
+    item = subscription.get(keepalive)
+    if item is None:
+      yield ': keepalive\n\n'
+    elif item is RESET:
+      yield 'event: reset\ndata: {}\n\n'
+    else:
+      id, changes = item
+      yield f'id: {id}\nevent: changes\ndata: {json.dumps(changes)}\n\n'
+
+class PostgresNotify:
+  """Relay changes between workers with Postgres LISTEN/NOTIFY.
+
+  ``install()`` makes commits NOTIFY ``channel`` with their changes instead
+  of publishing them locally, and ``start()`` runs the thread that LISTENs
+  on a dedicated connection and publishes what it hears on the local bus,
+  the notifications of this worker included. NOTIFY payloads are limited
+  to 8000 bytes, larger transactions are split over several.
+  """
+
+  MAX_PAYLOAD = 7900
+
+  def __init__(self, bus, channel='todo_changes'):
+    self.bus = bus
+    self.channel = channel
+    self.thread = None
+    self.lock = threading.Lock()
+
+  def payloads(self, changes):
+    chunk = []
+    for change in changes:
+      if chunk and len(json.dumps(chunk + [change])) > self.MAX_PAYLOAD:
+        yield json.dumps(chunk)
+        chunk = []
+      chunk.append(change)
+    if chunk:
+      payload = json.dumps(chunk)
+      # a single change too large to send, the clients reload instead
+      yield payload if len(payload) <= self.MAX_PAYLOAD else json.dumps('reset')
+
+  def install(self, session):
+    """NOTIFY the recorded changes of ``session`` when it commits."""
+    @event.listens_for(session, 'before_commit')
+    def notify(session):
+      changes = session.info.pop('todo_changes', None)
+      for payload in self.payloads(changes or []):
+        session.execute('SELECT pg_notify(:channel, :payload)',
+          {'channel': self.channel, 'payload': payload})
+
+    @event.listens_for(session, 'after_soft_rollback')
+    def discard(session, previous_transaction):
+      session.info.pop('todo_changes', None)
+
+  def start(self, engine):
+    """Start the listener thread, once per process."""
+    with self.lock:
+      if self.thread is None or not self.thread.is_alive():
+        self.thread = threading.Thread(target=self.listen, args=(engine,),
+          name='todo-listen', daemon=True)
+        self.thread.start()
+
+  def listen(self, engine):
+    while True:
+      connection = None
+      try:
+        # a long lived connection of its own, outside the pool
+        connection = engine.raw_connection()
+        connection.detach()
+        connection.connection.autocommit = True
+        connection.cursor().execute(f'LISTEN "{self.channel}"')
+        # notifications sent while not listening were lost
+        self.bus.reset()
+        while True:
+          if select.select([connection.connection], [], [], 60) == ([], [], []):
+            continue
+          connection.connection.poll()
+          while connection.connection.notifies:
+            changes = json.loads(connection.connection.notifies.pop(0).payload)
+            if changes == 'reset':
+              self.bus.reset()
+            else:
+              self.bus.publish(changes)
+      except Exception:
+        print('todo events listener failed, reconnecting', sys.exc_info())
+        if connection is not None:
+          connection.close()
+        time.sleep(1)
@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+import unittest
+
+import events
+from app import app, db, bus, toggles, Todo, TODOS_PER_PAGE
+
+class TodoAppTestCase(unittest.TestCase):
+  """This class represents the todoapp test case"""
+
+  def setUp(self):
+    """Define test variables and initialize app."""
+    self.database_path = os.environ.get(
+      'TEST_DATABASE_URL', 'postgres://amy@localhost:5432/todoapp_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = self.database_path
+    self.client = app.test_client
+
+    # binds the app to the current context and creates fresh tables
+    self.ctx = app.app_context()
+    self.ctx.push()
+    db.drop_all()
+    db.create_all()
+    self.todos = [Todo(description=f'Todo {i}', completed=False) for i in range(3)]
+    db.session.add_all(self.todos)
+    db.session.commit()
+    self.ids = [todo.id for todo in self.todos]
+
+  def tearDown(self):
+    """Executed after reach test"""
+    db.session.remove()
+    db.drop_all()
+    self.ctx.pop()
+
+  # test to check a batch applies every kind of operation and reports each
+  def test_batch_todos(self):
+    first, second, third = self.ids
+    response = self.client().post('/todos/batch', json={'operations': [
+      {'op': 'complete', 'id': first, 'completed': True},
+      {'op': 'create', 'description': 'Buy milk'},
+      {'op': 'delete', 'id': second},
+      {'op': 'delete', 'id': 1000},
+      {'op': 'complete', 'id': third, 'completed': True},
+      {'op': 'complete', 'id': third, 'completed': False},
+    ]})
+    self.assertEqual(response.status_code, 200)
+    results = response.get_json()['results']
+    self.assertEqual([r['success'] for r in results], [True] * 3 + [False] + [True] * 2)
+    self.assertEqual(results[3]['error'], 'not found')
+    created = results[1]['id']
+    todos = {todo.id: todo for todo in Todo.query}
+    self.assertEqual(set(todos), {first, third, created})
+    self.assertTrue(todos[first].completed)
+    self.assertFalse(todos[third].completed)
+    self.assertEqual(todos[created].description, 'Buy milk')
+
+  # test to check an invalid batch is rejected without applying any of it
+  def test_batch_todos_invalid(self):
+    for body in [{}, {'operations': []}, {'operations': [{'op': 'delete', 'id': 'x'}]},
+        {'operations': [{'op': 'delete', 'id': self.ids[0]}, {'op': 'rename'}]}]:
+      response = self.client().post('/todos/batch', json=body)
+      self.assertEqual(response.status_code, 400)
+    self.assertEqual(Todo.query.count(), 3)
+
+  # test to check the JSON listing pages through todos after the last id
+  def test_list_todos(self):
+    first, second, third = self.ids
+    Todo.query.get(second).completed = True
+    db.session.commit()
+    data = self.client().get('/todos?limit=2').get_json()
+    self.assertEqual([t['id'] for t in data['todos']], [first, second])
+    self.assertEqual(data['next'], second)
+    data = self.client().get(f'/todos?limit=2&after={second}').get_json()
+    self.assertEqual([t['id'] for t in data['todos']], [third])
+    self.assertIsNone(data['next'])
+    data = self.client().get('/todos?completed=false').get_json()
+    self.assertEqual([t['id'] for t in data['todos']], [first, third])
+    self.assertEqual(self.client().get('/todos?completed=maybe').status_code, 400)
+
+  # test to check the index renders one page with a link to the next
+  def test_index_pages(self):
+    db.session.execute(Todo.__table__.insert(),
+      [{'description': f'More {i}', 'completed': False} for i in range(TODOS_PER_PAGE)])
+    db.session.commit()
+    page = self.client().get('/').data.decode()
+    self.assertEqual(page.count('class="delete-button"'), TODOS_PER_PAGE)
+    last = max(self.ids) + TODOS_PER_PAGE - 3
+    self.assertIn(f'href="/?after={last}"', page)
+    page = self.client().get(f'/?after={last}').data.decode()
+    self.assertEqual(page.count('class="delete-button"'), 3)
+    self.assertNotIn('id="next-page"', page)
+
+  # test to check the export streams every todo as a JSON line
+  def test_export_todos(self):
+    response = self.client().get('/todos/export')
+    self.assertEqual(response.mimetype, 'application/x-ndjson')
+    self.assertTrue(response.is_streamed)
+    todos = [json.loads(line) for line in response.data.decode().splitlines()]
+    self.assertEqual([t['id'] for t in todos], self.ids)
+
+  # test to check committed changes are pushed to the event stream
+  def test_todo_events(self):
+    first, second, _ = self.ids
+    response = self.client().get('/todos/events', buffered=False)
+    self.assertEqual(response.mimetype, 'text/event-stream')
+    stream = iter(response.response)
+    self.assertEqual(next(stream), b'retry: 3000\n\n')
+    created = self.client().post('/todos/create', json={'description': 'Buy milk'}).get_json()
+    self.client().post('/todos/batch', json={'operations': [
+      {'op': 'complete', 'id': first, 'completed': True},
+      {'op': 'delete', 'id': second},
+      {'op': 'delete', 'id': 1000},
+    ]})
+    messages = [next(stream).decode(), next(stream).decode()]
+    self.assertIn('event: changes\n', messages[0])
+    changes = [json.loads(m.rpartition('data: ')[2]) for m in messages]
+    self.assertEqual(changes, [
+      [{'op': 'create', 'id': created['id'], 'description': 'Buy milk', 'completed': False}],
+      [{'op': 'complete', 'id': first, 'completed': True}, {'op': 'delete', 'id': second}],
+    ])
+    response.close()
+    self.assertEqual(len(bus.subscribers), 0)
+
+  # test to check a reconnecting client gets the events it missed, or a reset
+  def test_todo_events_replay(self):
+    test_bus = events.Bus(history=2)
+    for n in range(3):
+      test_bus.publish([{'op': 'delete', 'id': n}])
+    last = f'{test_bus.token}-2'
+    self.assertEqual(test_bus.subscribe(last).get(0), (f'{test_bus.token}-3', [{'op': 'delete', 'id': 2}]))
+    self.assertIs(test_bus.subscribe(f'{test_bus.token}-0').get(0), events.RESET)
+    self.assertIs(test_bus.subscribe('elsewhere-3').get(0), events.RESET)
+    subscription = test_bus.subscribe()
+    self.assertIsNone(subscription.get(0))
+    test_bus.reset()
+    self.assertIs(subscription.get(0), events.RESET)
+    self.assertIs(test_bus.subscribe(last).get(0), events.RESET)
+
+  # test to check a rolled back transaction publishes nothing
+  def test_todo_events_rollback(self):
+    subscription = bus.subscribe()
+    try:
+      events.record(db.session, {'op': 'delete', 'id': self.ids[0]})
+      db.session.rollback()
+      db.session.commit()
+      self.assertIsNone(subscription.get(0))
+    finally:
+      bus.unsubscribe(subscription)
+
+  # test to check a burst of toggles is written by one commit, last toggle winning
+  def test_set_completed_coalesced(self):
+    first, second, _ = self.ids
+    flushes = toggles.stats['flushes']
+    clicks = [(first, True), (second, True), (first, True), (second, True)]
+    barrier = threading.Barrier(len(clicks))
+    responses = []
+
+    def click(todo_id, completed):
+      client = self.client()
+      barrier.wait()
+      responses.append(client.post(f'/todos/{todo_id}/set-completed',
+        json={'completed': completed}))
+
+    # wide enough for every click to land in the first window
+    window, toggles.window = toggles.window, 0.5
+    try:
+      threads = [threading.Thread(target=click, args=c) for c in clicks]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+    finally:
+      toggles.window = window
+    self.assertEqual([r.status_code for r in responses], [200] * len(clicks))
+    self.assertEqual(set(responses[0].get_json()), {'success', 'id', 'completed'})
+    self.assertEqual(toggles.stats['flushes'], flushes + 1)
+    db.session.expire_all()
+    self.assertEqual([Todo.query.get(id).completed for id in self.ids], [True, True, False])
+    # repeated flips of one todo merge into its last value
+    toggles.toggle(first, False)
+    toggles.toggle(second, False)
+    toggles.toggle(first, True).wait(5)
+    self.assertEqual(toggles.stats['flushes'], flushes + 2)
+    db.session.expire_all()
+    self.assertEqual([Todo.query.get(id).completed for id in self.ids], [True, False, False])
+    response = self.client().post(f'/todos/{first}/set-completed', json={'completed': 'yes'})
+    self.assertEqual(response.status_code, 400)
+
+  # test to check toggling a missing todo answers 404 and publishes nothing
+  def test_set_completed_missing(self):
+    missing = max(self.ids) + 1000
+    subscription = bus.subscribe()
+    try:
+      response = self.client().post(f'/todos/{missing}/set-completed',
+        json={'completed': True})
+      self.assertEqual(response.status_code, 404)
+      self.assertIsNone(subscription.get(0))
+      # a batch mixing both only reports the todo that exists
+      toggles.toggle(missing, True)
+      batch = toggles.toggle(self.ids[0], True)
+      batch.wait(5)
+      self.assertEqual(batch.written, {self.ids[0]})
+      _, changes = subscription.get(1)
+      self.assertEqual(changes, [{'op': 'complete', 'id': self.ids[0], 'completed': True}])
+    finally:
+      bus.unsubscribe(subscription)
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,146 @@
+"""In-process cache of the categories and of the question ids in each.
+
+Every question listing sends the categories along, and validating a
+category or paging through one only needs ids, so both come from a
+snapshot loaded on first use with two queries:
+
+- ``categories()``: {id: type}, for listings and validation
+- ``question_ids(category=None)``: sorted ids of one category, or of all
+
+Commits of the ORM session keep the snapshot current: inserted, deleted and
+recategorised questions move in the index, and any change to a category
+reloads it. Rolled back changes are ignored. Writes made outside the ORM or
+by other processes show up after ``invalidate()``, or once the snapshot is
+``CATALOG_MAX_AGE`` seconds old.
+"""
+import bisect
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+
+from models import db, Category, Question
+
+_listening = False
+
+# a recorded change removing the question from the index
+REMOVED = object()
+
+
+def category_key(category):
+    """Question.category as the id of its category, None if not one."""
+    try:
+        return int(category)
+    except (TypeError, ValueError):
+        return None
+
+
+def record_changes(session, flush_context):
+    """Note the questions and categories a flush wrote, applied on commit.
+
+    Changes are (question id, category key or REMOVED), or None when a
+    category changed and the snapshot must be reloaded.
+    """
+    changes = session.info.setdefault("catalog_changes", [])
+    for obj in session.new:
+        if isinstance(obj, Question):
+            changes.append((obj.id, category_key(obj.category)))
+        elif isinstance(obj, Category):
+            changes.append(None)
+    for obj in session.deleted:
+        if isinstance(obj, Question):
+            changes.append((obj.id, REMOVED))
+        elif isinstance(obj, Category):
+            changes.append(None)
+    for obj in session.dirty:
+        if isinstance(obj, Question):
+            if inspect(obj).attrs.category.history.has_changes():
+                changes.append((obj.id, category_key(obj.category)))
+        elif isinstance(obj, Category) and session.is_modified(obj):
+            changes.append(None)
+
+
+def apply_changes(session):
+    changes = session.info.pop("catalog_changes", None)
+    if changes and has_app_context():
+        catalog = current_app.extensions.get("catalog")
+        if catalog is not None:
+            catalog.apply(changes)
+
+
+def discard_changes(session, previous_transaction):
+    session.info.pop("catalog_changes", None)
+
+
+class Catalog:
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.loaded_at = None
+        self.categories_by_id = dict()
+        self.index = dict()
+        self.all_ids = list()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        global _listening
+        app.config.setdefault("CATALOG_MAX_AGE", 60)
+        app.extensions["catalog"] = self
+        if not _listening:
+            event.listen(db.session, "after_flush", record_changes)
+            event.listen(db.session, "after_commit", apply_changes)
+            event.listen(db.session, "after_soft_rollback", discard_changes)
+            _listening = True
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = None
+
+    def load(self):
+        """Reload the snapshot when there is none or it is too old."""
+        max_age = current_app.config["CATALOG_MAX_AGE"]
+        with self.lock:
+            if self.loaded_at is not None and (
+                max_age is None or time.monotonic() - self.loaded_at < max_age
+            ):
+                return
+            self.categories_by_id = dict(
+                db.session.query(Category.id, Category.type).order_by(Category.id)
+            )
+            self.index = dict()
+            self.all_ids = list()
+            questions = db.session.query(Question.id, Question.category)
+            for id, category in questions.order_by(Question.id):
+                self.index.setdefault(category_key(category), []).append(id)
+                self.all_ids.append(id)
+            self.loaded_at = time.monotonic()
+
+    def categories(self):
+        self.load()
+        with self.lock:
+            return dict(self.categories_by_id)
+
+    def question_ids(self, category=None):
+        self.load()
+        with self.lock:
+            if category is None:
+                return list(self.all_ids)
+            return list(self.index.get(category, ()))
+
+    def apply(self, changes):
+        with self.lock:
+            if self.loaded_at is None:
+                return
+            for change in changes:
+                if change is None:
+                    self.loaded_at = None
+                    return
+                id, category = change
+                for ids in [self.all_ids, *self.index.values()]:
+                    position = bisect.bisect_left(ids, id)
+                    if position < len(ids) and ids[position] == id:
+                        del ids[position]
+                if category is not REMOVED:
+                    bisect.insort(self.all_ids, id)
+                    bisect.insort(self.index.setdefault(category, []), id)
@@ -1,10 +1,12 @@
 import os
-from flask import Flask, request, abort, jsonify, redirect, url_for
+import random
+from flask import Flask, request, abort, jsonify, redirect, url_for, current_app
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.sql.expression import func
 from flask_cors import CORS
 
-from models import setup_db, Question, Category
+from models import setup_db, Question
+from instrumentation import QueryInstrumentation
+from catalog import Catalog
 
 QUESTIONS_PER_PAGE = 10
 
@@ -20,15 +22,23 @@ def paginate_questions(request, selection):
     return current_questions
 
 
+# function to paginate a list of question ids, loading only the page
+def paginate_question_ids(request, ids):
+    page = request.args.get("page", 1, type=int)
+    start = (page - 1) * QUESTIONS_PER_PAGE
+    end = start + QUESTIONS_PER_PAGE
+
+    page_ids = ids[start:end]
+    if not page_ids:
+        return []
+    selection = Question.query.filter(Question.id.in_(page_ids)).order_by(Question.id)
+    return [question.format() for question in selection]
+
+
 # function to query categories
 def query_all_categories():
-    # query all categories
-    category = Category.query.all()
-    # format the response
-    categories = dict()
-    for c in category:
-        categories[c.id] = c.type
-    return categories
+    # categories are cached in process, see catalog.py
+    return current_app.extensions["catalog"].categories()
 
 
 def create_app(test_config=None):
@@ -36,6 +46,10 @@ def create_app(test_config=None):
     app = Flask(__name__)
     setup_db(app)
     CORS(app, resources={r"/*": {"origins": "*"}})
+    # report per request query counts and database time
+    QueryInstrumentation(app)
+    # categories and question ids by category, kept in memory
+    catalog = Catalog(app)
 
     # CORS Headers / after response configuration and access control
     @app.after_request
@@ -57,15 +71,15 @@ def create_app(test_config=None):
     # route to handle questions GET requests
     @app.route("/questions")
     def get_questions():
-        # query all questions
-        selection = Question.query.all()
-        # paginate questions
-        questions = paginate_questions(request, selection)
+        # ids of all questions, from the catalog
+        ids = catalog.question_ids()
+        # load the questions of the page
+        questions = paginate_question_ids(request, ids)
         # query all categories
         categories = query_all_categories()
         response = {
             "questions": questions,
-            "total_questions": len(selection),
+            "total_questions": len(ids),
             "categories": categories,
             "current_category": None,
         }
@@ -132,16 +146,15 @@ def create_app(test_config=None):
     # route to handle questions filtering by category GET requests
     @app.route("/categories/<int:id>/questions")
     def get_category_questions(id):
-        categories = [c[0] for c in Category.query.with_entities(Category.id).all()]
-        if id not in categories:
+        if id not in catalog.categories():
             abort(404)
         try:
-            # get questions by category id
-            selection = Question.query.filter_by(category=id).all()
-            questions = paginate_questions(request, selection)
+            # get question ids by category id
+            ids = catalog.question_ids(id)
+            questions = paginate_question_ids(request, ids)
             response = {
                 "questions": questions,
-                "total_questions": len(selection),
+                "total_questions": len(ids),
                 "current_category": id,
             }
             return jsonify(response), 200
@@ -157,23 +170,19 @@ def create_app(test_config=None):
         category = int(json_body.get("quiz_category")["id"])
 
         try:
-            # get questions with category id & exclude previous question ids
-            # if category id = 0 get all categories
-            if category == 0:
-                question = (
-                    Question.query.filter(Question.id.notin_(previous_questions))
-                    .order_by(func.random())
-                    .first()
-                )
-                print(question)
-            else:
-                question = (
-                    Question.query.filter_by(category=category)
-                    .filter(Question.id.notin_(previous_questions))
-                    .order_by(func.random())
-                    .first()
-                )
-                print(question)
+            # pick a question id of the category, excluding previous ones
+            # if category id = 0 pick from all categories
+            question = None
+            for attempt in range(2):
+                ids = catalog.question_ids(None if category == 0 else category)
+                remaining = sorted(set(ids).difference(previous_questions))
+                if not remaining:
+                    break
+                question = Question.query.get(random.choice(remaining))
+                if question is not None:
+                    break
+                # deleted by another process, reload the ids and pick again
+                catalog.invalidate()
 
             # return empty response if no more questions exist
             if not question:
@@ -13,6 +13,8 @@ class TriviaTestCase(unittest.TestCase):
     def setUp(self):
         """Define test variables and initialize app."""
         self.app = create_app()
+        # fail any request running the same statement more than 3 times
+        self.app.config["SQL_STRICT_MAX_REPEATS"] = 3
         self.client = self.app.test_client
         # self.database_name = "trivia_test"
         # self.database_path = "postgres://{}/{}".format(
@@ -134,6 +136,30 @@ class TriviaTestCase(unittest.TestCase):
         response = self.client().get(f"/categories/{category_id}/questions")
         self.assertEqual(response.status_code, 404)
 
+    # test to check category listing and validation are served from the cache
+    def test_categories_cached(self):
+        self.client().get("/categories")
+        response = self.client().get("/categories")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Query-Count"], "0")
+        response = self.client().get("/categories/9001/questions")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.headers["X-Query-Count"], "0")
+
+    # test to check the question index follows question inserts and deletes
+    def test_question_index_refreshed(self):
+        path = "/categories/3/questions"
+        total = json.loads(self.client().get(path).data)["total_questions"]
+        with self.app.app_context():
+            question = Question("index question", "index answer", 3, 1)
+            question.insert()
+            question_id = question.id
+        data = json.loads(self.client().get(path).data)
+        self.assertEqual(data["total_questions"], total + 1)
+        self.client().delete(f"/questions/{question_id}")
+        data = json.loads(self.client().get(path).data)
+        self.assertEqual(data["total_questions"], total)
+
     # test to check "/quizzes" [POST] route
     def test_get_quiz_questions(self):
         test_data = {
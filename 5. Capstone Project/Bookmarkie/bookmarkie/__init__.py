@@ -3,6 +3,7 @@ from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from .models import setup_db, Url, Directory
+from .instrumentation import QueryInstrumentation
 from bookmarkie.auth.auth import requires_auth, AuthError
 from werkzeug.exceptions import BadRequest
 
@@ -22,6 +23,9 @@ def create_app(test_config=None):
     # set up CORS, allowing all origins
     CORS(app, resources={"/": {"origins": "*"}})
 
+    # report per request query counts and database time
+    QueryInstrumentation(app)
+
     @app.after_request
     def after_request(response):
         """
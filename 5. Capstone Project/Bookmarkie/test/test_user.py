@@ -21,6 +21,8 @@ class BookmarkieUserTestCase(unittest.TestCase):
     def setUp(self):
         """Define test variable and initialize app"""
         self.app = create_app()
+        # fail any request running the same statement more than 3 times
+        self.app.config["SQL_STRICT_MAX_REPEATS"] = 3
         self.client = self.app.test_client
         self.database_filename = "bookmarkie_test.db"
         self.project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))